@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+配置读取
+从config.py读取可选配置项，未配置时使用默认值
+"""
+
+
+def get_setting(name, default=None):
+    """读取config.py中的配置项，不存在时返回默认值"""
+    try:
+        import config
+    except ImportError:
+        return default
+    return getattr(config, name, default)
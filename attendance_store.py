@@ -0,0 +1,715 @@
+# -*- coding: utf-8 -*-
+"""
+考勤记录存储
+统一考勤记录的格式、写入方式和打卡冷却期判断，供图形界面、离线批处理等入口共用。
+
+支持两种存储后端（config.py 中的 ATTENDANCE_BACKEND）：
+- sqlite: 嵌入式SQLite数据库（WAL模式），按员工ID和日期建索引，
+          首次启动时自动导入已有的 attendance.csv（默认）
+- csv:    原有的追加写CSV文件
+
+每次写入时同步更新"每名员工最后打卡时间"索引（SQLite中的last_checkin表，CSV旁的
+<文件名>.last_checkin.json），重启后按员工数量加载即可恢复打卡冷却期，无需扫描全部历史。
+
+同时增量维护汇总表（员工每日首次/最后打卡、每日出勤人数、员工月度汇总），
+供智能问答使用，避免把全部考勤明细放进提示词。
+
+AttendanceWriter 在后台线程中批量写入（组提交），识别线程只需把记录放入队列，不会被磁盘I/O阻塞。
+
+命令行:
+    python attendance_store.py import attendance.csv   # 导入CSV到数据库
+    python attendance_store.py export attendance.csv   # 从数据库导出CSV
+"""
+
+import argparse
+import datetime
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from app_config import get_setting
+
+ATTENDANCE_FILE = "attendance.csv"
+# CSV存储的最后打卡时间索引文件后缀
+LAST_CHECKIN_SUFFIX = ".last_checkin.json"
+ATTENDANCE_DB = "attendance.db"
+
+# 考勤CSV格式：员工ID,姓名,日期,时间,签到时间
+ATTENDANCE_COLUMNS = ["员工ID", "姓名", "日期", "时间", "签到时间"]
+
+# 同一员工两次打卡的最小间隔（默认5分钟，可在config.py中配置）
+COOLDOWN_SECONDS = get_setting("COOLDOWN_SECONDS", 300)
+
+# 签到时间格式
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 汇总表格式
+DAILY_COLUMNS = ["员工ID", "姓名", "日期", "首次打卡", "最后打卡", "打卡次数"]
+HEADCOUNT_COLUMNS = ["日期", "出勤人数", "打卡次数"]
+MONTHLY_COLUMNS = ["员工ID", "姓名", "月份", "出勤天数", "打卡次数"]
+
+
+def attendance_row(emp_id, emp_name, timestamp):
+    """根据打卡时间生成一行考勤记录"""
+    return {
+        "员工ID": emp_id,
+        "姓名": emp_name,
+        "日期": timestamp.strftime("%Y-%m-%d"),
+        "时间": timestamp.strftime("%H:%M:%S"),
+        "签到时间": timestamp.strftime(DATETIME_FORMAT),
+    }
+
+
+def ensure_attendance_file(path=ATTENDANCE_FILE):
+    """创建考勤CSV文件（如果不存在）"""
+    if not os.path.exists(path):
+        df = pd.DataFrame(columns=ATTENDANCE_COLUMNS)
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+
+
+def append_attendance(rows, path=ATTENDANCE_FILE):
+    """追加考勤记录到CSV文件"""
+    if not rows:
+        return
+    ensure_attendance_file(path)
+    df = pd.DataFrame(rows, columns=ATTENDANCE_COLUMNS)
+    df.to_csv(path, mode='a', header=False, index=False, encoding="utf-8-sig")
+
+
+class CooldownTracker:
+    """打卡冷却期判断：同一员工在冷却期内只记录一次"""
+
+    def __init__(self, cooldown_seconds=COOLDOWN_SECONDS):
+        self.cooldown_seconds = cooldown_seconds
+        self.last_times = {}
+
+    def load(self, last_times):
+        """加载持久化的最后打卡时间（启动时恢复冷却期）"""
+        for emp_id, timestamp in last_times.items():
+            if emp_id not in self.last_times or timestamp > self.last_times[emp_id]:
+                self.last_times[emp_id] = timestamp
+
+    def in_cooldown(self, emp_id, timestamp):
+        """判断该员工在给定时间是否处于冷却期内（多摄像头的事件可能晚于更新的打卡到达，按时间差的绝对值判断）"""
+        last_time = self.last_times.get(emp_id)
+        if last_time is None:
+            return False
+        return abs((timestamp - last_time).total_seconds()) < self.cooldown_seconds
+
+    def mark(self, emp_id, timestamp):
+        """记录该员工的最后打卡时间（晚到的较早事件不会把最后打卡时间往前改）"""
+        last_time = self.last_times.get(emp_id)
+        if last_time is None or timestamp > last_time:
+            self.last_times[emp_id] = timestamp
+
+    def filter(self, events):
+        """按时间顺序过滤打卡事件，返回冷却期外的事件"""
+        accepted = []
+        for event in sorted(events, key=lambda e: e.timestamp):
+            if not self.in_cooldown(event.emp_id, event.timestamp):
+                self.mark(event.emp_id, event.timestamp)
+                accepted.append(event)
+        return accepted
+
+
+
+def summarize_daily(df):
+    """从考勤明细计算员工每日首次/最后打卡"""
+    if df.empty:
+        return pd.DataFrame(columns=DAILY_COLUMNS)
+    daily = df.groupby(["员工ID", "日期"]).agg(
+        姓名=("姓名", "last"), 首次打卡=("时间", "min"), 最后打卡=("时间", "max"), 打卡次数=("时间", "size"),
+    ).reset_index()
+    return daily.sort_values(["日期", "首次打卡"], kind="stable")[DAILY_COLUMNS].reset_index(drop=True)
+
+
+def summarize_headcount(daily):
+    """从员工每日汇总计算每日出勤人数"""
+    if daily.empty:
+        return pd.DataFrame(columns=HEADCOUNT_COLUMNS)
+    return daily.groupby("日期").agg(出勤人数=("员工ID", "size"), 打卡次数=("打卡次数", "sum")).reset_index()
+
+
+def summarize_monthly(daily):
+    """从员工每日汇总计算员工月度出勤"""
+    if daily.empty:
+        return pd.DataFrame(columns=MONTHLY_COLUMNS)
+    monthly = daily.assign(月份=daily["日期"].str[:7]).groupby(["员工ID", "月份"]).agg(
+        姓名=("姓名", "last"), 出勤天数=("日期", "size"), 打卡次数=("打卡次数", "sum"),
+    ).reset_index()
+    return monthly.sort_values(["月份", "员工ID"], kind="stable")[MONTHLY_COLUMNS].reset_index(drop=True)
+
+
+def last_checkin_path(path):
+    """CSV考勤文件对应的最后打卡时间索引文件，如 attendance.csv.last_checkin.json"""
+    return os.path.abspath(path) + LAST_CHECKIN_SUFFIX
+
+
+class CsvAttendanceStore:
+    """CSV考勤存储（每次查询都会读取整个文件）"""
+
+    def __init__(self, path=ATTENDANCE_FILE):
+        self.path = path
+        # 最后打卡时间索引，按CSV文件名命名（同一目录下的多个CSV各有各的索引）
+        self.index_path = last_checkin_path(path)
+        ensure_attendance_file(path)
+        self.last_index = self._load_index()
+
+    def _load_index(self):
+        """读取最后打卡时间索引；索引不存在时从CSV重建一次"""
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass  # 索引损坏时重建
+
+        df = self.read_all()
+        index = {}
+        if not df.empty:
+            index = df.groupby("员工ID")["签到时间"].max().to_dict()
+        self._save_index(index)
+        return index
+
+    def _save_index(self, index):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def append(self, rows):
+        """追加考勤记录，并更新最后打卡时间索引"""
+        append_attendance(rows, self.path)
+        for row in rows:
+            emp_id = str(row["员工ID"])
+            if row["签到时间"] > self.last_index.get(emp_id, ""):
+                self.last_index[emp_id] = row["签到时间"]
+        self._save_index(self.last_index)
+
+    def last_checkins(self):
+        """返回 {员工ID: 最后打卡时间}"""
+        return {emp_id: datetime.datetime.strptime(value, DATETIME_FORMAT)
+                for emp_id, value in self.last_index.items()}
+
+    def query(self, start_date=None, end_date=None, emp_id=None):
+        """按日期范围（含两端，YYYY-MM-DD）和员工ID查询，返回DataFrame"""
+        df = self.read_all()
+        if start_date:
+            df = df[df["日期"] >= start_date]
+        if end_date:
+            df = df[df["日期"] <= end_date]
+        if emp_id:
+            df = df[df["员工ID"] == emp_id]
+        return df.reset_index(drop=True)
+
+    def read_all(self):
+        """读取全部考勤记录"""
+        if not os.path.exists(self.path):
+            return pd.DataFrame(columns=ATTENDANCE_COLUMNS)
+        return pd.read_csv(self.path, dtype=str, encoding="utf-8-sig")
+
+    def daily_summary(self, start_date=None, end_date=None, emp_id=None):
+        """员工每日首次/最后打卡（CSV存储需要临时计算）"""
+        return summarize_daily(self.query(start_date, end_date, emp_id))
+
+    def daily_headcount(self, start_date=None, end_date=None):
+        """每日出勤人数"""
+        return summarize_headcount(self.daily_summary(start_date, end_date))
+
+    def monthly_totals(self, start_month=None, end_month=None, emp_id=None):
+        """员工月度出勤汇总"""
+        start_date = f"{start_month}-01" if start_month else None
+        end_date = f"{end_month}-31" if end_month else None
+        return summarize_monthly(self.daily_summary(start_date, end_date, emp_id))
+
+    def data_version(self):
+        """数据版本标识，有新记录写入后会变化（取CSV文件的大小和修改时间）"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return "csv:0"
+        return f"csv:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def export_csv(self, path):
+        """导出为CSV文件"""
+        self.read_all().to_csv(path, index=False, encoding="utf-8-sig")
+
+    def sync(self):
+        """把已写入的数据刷到磁盘"""
+        with open(self.path, 'a') as f:
+            os.fsync(f.fileno())
+
+    def close(self):
+        pass
+
+
+class SqliteAttendanceStore:
+    """SQLite考勤存储（WAL模式，按员工ID和日期建索引）"""
+
+    # 数据库列名与CSV列名的对应关系
+    COLUMN_MAP = [
+        ("emp_id", "员工ID"),
+        ("name", "姓名"),
+        ("date", "日期"),
+        ("time", "时间"),
+        ("checkin_at", "签到时间"),
+    ]
+
+    def __init__(self, path=ATTENDANCE_DB):
+        self.path = path
+        # 识别线程、查询线程都会访问，同一连接用锁串行化
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS attendance (
+                    id INTEGER PRIMARY KEY,
+                    emp_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    time TEXT NOT NULL,
+                    checkin_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_attendance_emp_date ON attendance (emp_id, date);
+                CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance (date);
+                CREATE TABLE IF NOT EXISTS last_checkin (
+                    emp_id TEXT PRIMARY KEY,
+                    checkin_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS daily_employee (
+                    emp_id TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    first_time TEXT NOT NULL,
+                    last_time TEXT NOT NULL,
+                    checkins INTEGER NOT NULL,
+                    PRIMARY KEY (emp_id, date)
+                );
+                CREATE INDEX IF NOT EXISTS idx_daily_employee_date ON daily_employee (date);
+                CREATE TABLE IF NOT EXISTS daily_headcount (
+                    date TEXT PRIMARY KEY,
+                    headcount INTEGER NOT NULL,
+                    checkins INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS monthly_employee (
+                    emp_id TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    days INTEGER NOT NULL,
+                    checkins INTEGER NOT NULL,
+                    PRIMARY KEY (emp_id, month)
+                );
+                CREATE INDEX IF NOT EXISTS idx_monthly_employee_month ON monthly_employee (month);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+            # 旧数据库没有索引表时从历史记录重建一次
+            if self.conn.execute("SELECT value FROM meta WHERE key = 'last_checkin_built'").fetchone() is None:
+                self._rebuild_last_checkin()
+            # 旧数据库没有汇总表时从历史记录重建一次
+            if self.conn.execute("SELECT value FROM meta WHERE key = 'rollups_built'").fetchone() is None:
+                self._rebuild_rollups()
+
+    def _rebuild_last_checkin(self):
+        """从全部历史记录重建最后打卡时间索引（调用方负责加锁和提交）"""
+        self.conn.execute("""
+            INSERT OR REPLACE INTO last_checkin (emp_id, checkin_at)
+            SELECT emp_id, MAX(checkin_at) FROM attendance GROUP BY emp_id
+        """)
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_checkin_built', '1')")
+
+    def _rebuild_rollups(self):
+        """从全部历史记录重建汇总表（调用方负责加锁和提交）"""
+        self.conn.executescript("""
+            DELETE FROM daily_employee;
+            INSERT INTO daily_employee (emp_id, date, name, first_time, last_time, checkins)
+            SELECT emp_id, date, MAX(name), MIN(time), MAX(time), COUNT(*) FROM attendance GROUP BY emp_id, date;
+            DELETE FROM daily_headcount;
+            INSERT INTO daily_headcount (date, headcount, checkins)
+            SELECT date, COUNT(*), SUM(checkins) FROM daily_employee GROUP BY date;
+            DELETE FROM monthly_employee;
+            INSERT INTO monthly_employee (emp_id, month, name, days, checkins)
+            SELECT emp_id, substr(date, 1, 7), MAX(name), COUNT(*), SUM(checkins)
+            FROM daily_employee GROUP BY emp_id, substr(date, 1, 7);
+            INSERT OR REPLACE INTO meta (key, value) VALUES ('rollups_built', '1');
+        """)
+
+    def _update_rollups(self, emp_id, name, date, time_str):
+        """为一条新记录增量更新汇总表（调用方负责加锁和提交）"""
+        cursor = self.conn.execute(
+            """
+            UPDATE daily_employee
+            SET name = ?, first_time = MIN(first_time, ?), last_time = MAX(last_time, ?), checkins = checkins + 1
+            WHERE emp_id = ? AND date = ?
+            """,
+            (name, time_str, time_str, emp_id, date),
+        )
+        new_day = 1 if cursor.rowcount == 0 else 0
+        if new_day:
+            self.conn.execute(
+                "INSERT INTO daily_employee (emp_id, date, name, first_time, last_time, checkins) VALUES (?, ?, ?, ?, ?, 1)",
+                (emp_id, date, name, time_str, time_str),
+            )
+        self.conn.execute(
+            """
+            INSERT INTO daily_headcount (date, headcount, checkins) VALUES (?, ?, 1)
+            ON CONFLICT(date) DO UPDATE SET headcount = headcount + excluded.headcount, checkins = checkins + 1
+            """,
+            (date, new_day),
+        )
+        self.conn.execute(
+            """
+            INSERT INTO monthly_employee (emp_id, month, name, days, checkins) VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT(emp_id, month) DO UPDATE
+            SET name = excluded.name, days = days + excluded.days, checkins = checkins + 1
+            """,
+            (emp_id, date[:7], name, new_day),
+        )
+
+    def _insert_rows(self, rows):
+        """在当前事务中插入记录并更新最后打卡时间索引（调用方负责加锁和提交）"""
+        values = [tuple(str(row[column]) for _, column in self.COLUMN_MAP) for row in rows]
+        self.conn.executemany(
+            "INSERT INTO attendance (emp_id, name, date, time, checkin_at) VALUES (?, ?, ?, ?, ?)",
+            values,
+        )
+        self.conn.executemany(
+            """
+            INSERT INTO last_checkin (emp_id, checkin_at) VALUES (?, ?)
+            ON CONFLICT(emp_id) DO UPDATE SET checkin_at = excluded.checkin_at
+            WHERE excluded.checkin_at > last_checkin.checkin_at
+            """,
+            [(value[0], value[4]) for value in values],
+        )
+        for emp_id, name, date, time_str, _ in values:
+            self._update_rollups(emp_id, name, date, time_str)
+
+    def last_checkins(self):
+        """返回 {员工ID: 最后打卡时间}（只读取索引表，与历史记录总量无关）"""
+        with self.lock:
+            rows = self.conn.execute("SELECT emp_id, checkin_at FROM last_checkin").fetchall()
+        return {emp_id: datetime.datetime.strptime(value, DATETIME_FORMAT) for emp_id, value in rows}
+
+    def append(self, rows):
+        """追加考勤记录"""
+        if not rows:
+            return
+        with self.lock, self.conn:
+            self._insert_rows(rows)
+
+    def query(self, start_date=None, end_date=None, emp_id=None):
+        """按日期范围（含两端，YYYY-MM-DD）和员工ID查询，返回DataFrame（走索引）"""
+        conditions = []
+        params = []
+        if start_date:
+            conditions.append("date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("date <= ?")
+            params.append(end_date)
+        if emp_id:
+            conditions.append("emp_id = ?")
+            params.append(str(emp_id))
+
+        columns = ", ".join(f'{db} AS "{csv}"' for db, csv in self.COLUMN_MAP)
+        sql = f"SELECT {columns} FROM attendance"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY checkin_at, id"
+        with self.lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def read_all(self):
+        """读取全部考勤记录"""
+        return self.query()
+
+    def _read_frame(self, sql, params):
+        with self.lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    @staticmethod
+    def _where(conditions):
+        active = [(clause, value) for clause, value in conditions if value]
+        sql = " WHERE " + " AND ".join(clause for clause, _ in active) if active else ""
+        return sql, [str(value) for _, value in active]
+
+    def daily_summary(self, start_date=None, end_date=None, emp_id=None):
+        """员工每日首次/最后打卡（读取汇总表）"""
+        where, params = self._where([("date >= ?", start_date), ("date <= ?", end_date), ("emp_id = ?", emp_id)])
+        sql = (f'SELECT emp_id AS "员工ID", name AS "姓名", date AS "日期", first_time AS "首次打卡", '
+               f'last_time AS "最后打卡", checkins AS "打卡次数" FROM daily_employee{where} ORDER BY date, first_time')
+        return self._read_frame(sql, params)
+
+    def daily_headcount(self, start_date=None, end_date=None):
+        """每日出勤人数（读取汇总表）"""
+        where, params = self._where([("date >= ?", start_date), ("date <= ?", end_date)])
+        sql = (f'SELECT date AS "日期", headcount AS "出勤人数", checkins AS "打卡次数" '
+               f'FROM daily_headcount{where} ORDER BY date')
+        return self._read_frame(sql, params)
+
+    def monthly_totals(self, start_month=None, end_month=None, emp_id=None):
+        """员工月度出勤汇总（读取汇总表），月份格式为YYYY-MM"""
+        where, params = self._where([("month >= ?", start_month), ("month <= ?", end_month), ("emp_id = ?", emp_id)])
+        sql = (f'SELECT emp_id AS "员工ID", name AS "姓名", month AS "月份", days AS "出勤天数", '
+               f'checkins AS "打卡次数" FROM monthly_employee{where} ORDER BY month, emp_id')
+        return self._read_frame(sql, params)
+
+    def data_version(self):
+        """数据版本标识，有新记录写入后会变化（取最大记录ID，走主键）"""
+        with self.lock:
+            max_id = self.conn.execute("SELECT MAX(id) FROM attendance").fetchone()[0]
+        return f"sqlite:{max_id or 0}"
+
+    def count(self):
+        """记录总数"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def import_csv(self, csv_path):
+        """从CSV文件导入考勤记录，返回导入条数"""
+        df = pd.read_csv(csv_path, dtype=str, encoding="utf-8-sig").fillna("")
+        rows = df[ATTENDANCE_COLUMNS].to_dict("records")
+        with self.lock, self.conn:
+            self._insert_rows(rows)
+        return len(rows)
+
+    def import_csv_once(self, csv_path=ATTENDANCE_FILE):
+        """首次使用时自动导入已有的CSV（只执行一次），返回导入条数"""
+        if self.get_meta("csv_imported") or not os.path.exists(csv_path):
+            return 0
+        count = self.import_csv(csv_path)
+        self.set_meta("csv_imported", os.path.abspath(csv_path))
+        return count
+
+    def export_csv(self, path):
+        """导出为CSV文件（与原有attendance.csv格式一致）"""
+        self.read_all().to_csv(path, index=False, encoding="utf-8-sig")
+
+    def sync(self):
+        """把已提交的数据刷到磁盘（WAL检查点会先fsync日志）"""
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class AttendanceWriter:
+    """
+    后台考勤写入线程（组提交）
+    识别线程调用 submit() 把记录放入有界队列后立即返回；写入线程每积累 batch_size 条
+    或等待 flush_interval 秒后，在一个事务中批量写入。
+    fsync_policy: "batch" 每批写入后刷盘；"interval" 每隔 fsync_interval 秒刷盘；"none" 交给操作系统
+    """
+
+    _STOP = object()
+
+    def __init__(self, store, batch_size=32, flush_interval=0.2, queue_size=1000,
+                 fsync_policy="batch", fsync_interval=5.0, log=print):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.log = log
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.last_sync = time.monotonic()
+        # 有已提交但尚未刷盘的记录（"interval" 策略）
+        self.unsynced = False
+
+        # 统计计数
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def start(self):
+        """启动写入线程"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def submit(self, row):
+        """提交一条考勤记录（不阻塞），队列已满时返回False"""
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            self.log(f"❌ 考勤写入队列已满，丢弃记录: {row['姓名']} {row['签到时间']}")
+            return False
+        self.submitted += 1
+        return True
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            # 等待第一条记录；"interval" 策略下有未刷盘的记录时，最多等到刷盘时间
+            if self.unsynced:
+                try:
+                    item = self.queue.get(timeout=max(self.last_sync + self.fsync_interval - time.monotonic(), 0))
+                except queue.Empty:
+                    # 空闲时也按间隔刷盘，最后一批不必等到下一条记录或 close()
+                    self._sync()
+                    continue
+            else:
+                item = self.queue.get()
+            if item is self._STOP:
+                break
+            batch = [item]
+
+            # 继续收集，直到凑满一批或超时
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+
+        # 退出前写完队列中剩余的记录
+        remaining = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not self._STOP:
+                remaining.append(item)
+        if remaining:
+            self._flush(remaining)
+        if self.fsync_policy != "none":
+            self._sync()
+
+    def _flush(self, batch):
+        """在一个事务中写入一批记录"""
+        try:
+            self.store.append(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.log(f"❌ 考勤写入失败（{len(batch)} 条）: {str(e)}")
+            return
+
+        if self.fsync_policy == "batch":
+            self._sync()
+        elif self.fsync_policy == "interval":
+            if time.monotonic() - self.last_sync >= self.fsync_interval:
+                self._sync()
+            else:
+                self.unsynced = True
+
+    def _sync(self):
+        try:
+            self.store.sync()
+        except Exception as e:
+            self.log(f"考勤数据刷盘失败: {str(e)}")
+        self.last_sync = time.monotonic()
+        self.unsynced = False
+
+    def close(self, timeout=5.0):
+        """停止写入线程，等待队列中的记录全部写完"""
+        if self.thread is None:
+            return
+        self.queue.put(self._STOP)
+        self.thread.join(timeout=timeout)
+        self.thread = None
+
+    def stats(self):
+        """返回写入统计"""
+        return {
+            "submitted": self.submitted,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "pending": self.queue.qsize(),
+        }
+
+
+def create_attendance_writer(store, log=print):
+    """根据config.py创建并启动后台写入线程"""
+    return AttendanceWriter(
+        store,
+        batch_size=get_setting("WRITER_BATCH_SIZE", 32),
+        flush_interval=get_setting("WRITER_FLUSH_MS", 200) / 1000.0,
+        queue_size=get_setting("WRITER_QUEUE_SIZE", 1000),
+        fsync_policy=get_setting("WRITER_FSYNC", "batch"),
+        fsync_interval=get_setting("WRITER_FSYNC_INTERVAL", 5.0),
+        log=log,
+    ).start()
+
+
+def open_attendance_store(path):
+    """按文件扩展名打开考勤存储：.csv为CSV，其他为SQLite"""
+    if path.lower().endswith(".csv"):
+        return CsvAttendanceStore(path)
+    return SqliteAttendanceStore(path)
+
+
+def create_attendance_store(log=print):
+    """根据config.py创建考勤存储"""
+    if get_setting("ATTENDANCE_BACKEND", "sqlite") == "csv":
+        return CsvAttendanceStore(get_setting("ATTENDANCE_FILE", ATTENDANCE_FILE))
+
+    store = SqliteAttendanceStore(get_setting("ATTENDANCE_DB", ATTENDANCE_DB))
+    imported = store.import_csv_once(get_setting("ATTENDANCE_FILE", ATTENDANCE_FILE))
+    if imported:
+        log(f"已从CSV导入 {imported} 条考勤记录到数据库")
+    return store
+
+
+def main(argv=None):
+    """命令行入口：CSV导入/导出"""
+    parser = argparse.ArgumentParser(description="考勤数据库导入/导出")
+    parser.add_argument("action", choices=["import", "export"], help="import: CSV导入数据库; export: 数据库导出CSV")
+    parser.add_argument("csv", help="CSV文件路径")
+    parser.add_argument("--db", default=get_setting("ATTENDANCE_DB", ATTENDANCE_DB), help="数据库文件")
+    args = parser.parse_args(argv)
+
+    store = SqliteAttendanceStore(args.db)
+    try:
+        if args.action == "import":
+            count = store.import_csv(args.csv)
+            store.set_meta("csv_imported", os.path.abspath(args.csv))
+            print(f"✓ 已导入 {count} 条记录")
+        else:
+            store.export_csv(args.csv)
+            print(f"✓ 已导出 {store.count()} 条记录到 {args.csv}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
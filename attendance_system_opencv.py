@@ -9,22 +9,27 @@ pip install opencv-contrib-python pandas pillow requests numpy
 
 注意: 必须安装 opencv-contrib-python 而不是 opencv-python
 因为需要使用 cv2.face 模块
+
+启动时先显示界面，OpenCV、pandas、requests等较重的依赖以及字体、考勤存储、
+员工信息和识别模型在后台线程中加载，加载完成前相关按钮不可用。
 """
 
+import time
+
+# 启动计时起点
+STARTUP_TIME = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import cv2
-import pandas as pd
-import numpy as np
-from PIL import Image, ImageTk, ImageDraw, ImageFont
 import threading
 import queue
 import datetime
 import os
-import requests
 import json
 import pickle
 
+from app_config import get_setting
+
 # 员工面部编码存储
 employee_encodings = {}
 employee_names = {}
@@ -39,12 +44,21 @@ class FaceAttendanceSystem:
 
         # 摄像头相关
         self.cap = None
+        self.frame_grabber = None  # 摄像头采集线程（只处理最新的一帧）
+        self.frame_governor = None  # 帧率调节（无人时降低处理帧率）
         self.video_thread = None
         self.video_running = False
-        self.frame_queue = queue.Queue(maxsize=2)
         self.log_queue = queue.Queue()
-        self.last_recognition_time = {}
+        # 画面显示：工作线程只交出缩放好的RGB帧（只保留最新一帧），
+        # 主线程复用同一个PhotoImage和画布图像项，原地更新
+        self.display_lock = threading.Lock()
+        self.display_frame = None
+        self.display_shown = 0
+        self.display_skipped = 0
         self.current_photo = None  # 保持PhotoImage引用
+        self.video_item = None
+        self.video_item_position = None
+        self.overlay_enabled = get_setting("OVERLAY_ENABLED", True)
 
         # LLM API配置 - 从配置文件加载
         try:
@@ -58,33 +72,103 @@ class FaceAttendanceSystem:
             self.llm_api_key = "YOUR_API_KEY"
             self.llm_model = "deepseek-chat"
             print("警告: 未找到config.py，请复制config.example.py为config.py并配置API密钥")
+        self.llm_stream = get_setting("LLM_STREAM", True)
 
-        # 初始化employee_labels
+        # 以下资源在后台线程中加载（见load_resources）
+        self.ready = False
+        self.startup_timings = []
+        self.model_loaded = False
         self.employee_labels = {}
-
-        # 初始化中文字体
-        self.init_chinese_font()
-
-        # 创建必要的目录和文件
-        self.initialize_directories()
+        self.attendance_store = None
+        self.attendance_writer = None
+        self.llm_client = None
 
         # 初始化界面
         self.setup_ui()
+        self.set_controls_enabled(False)
+
+        # 启动日志处理线程
+        self.start_log_processor()
+        self.startup_timings.append(("界面", time.perf_counter() - STARTUP_TIME))
+
+        # 后台加载依赖、字体、考勤存储、员工信息和识别模型
+        self.status_label.config(text="状态: 正在加载...", foreground="orange")
+        threading.Thread(target=self.load_resources, daemon=True).start()
+
+    def load_resources(self):
+        """后台加载各项资源（后台线程），记录每个阶段的耗时"""
+        phases = [
+            ("导入模块", self.import_modules),
+            ("字体", self.init_chinese_font),
+            ("考勤存储", self.initialize_directories),
+            ("员工信息", self.load_employees),
+            ("识别模型", self.init_recognizer),
+            ("LLM客户端", self.init_llm_client),
+        ]
+        for name, load in phases:
+            self.root.after(0, self._set_status, f"状态: 正在加载{name}...", "orange")
+            start = time.perf_counter()
+            try:
+                load()
+            except Exception as e:
+                self.add_log(f"❌ 启动失败（{name}）: {str(e)}")
+                self.root.after(0, self._set_status, f"状态: {name}加载失败", "red")
+                return
+            self.startup_timings.append((name, time.perf_counter() - start))
+
+        self.root.after(0, self._on_resources_ready)
 
-        # 加载员工信息
-        self.load_employees()
+    def import_modules(self):
+        """导入依赖OpenCV、pandas、requests的模块（之后各方法中的导入直接取已加载的模块）"""
+        import recognition_pipeline, face_model, overlay, attendance_store  # noqa: F401
+        import llm_client, llm_cache, prompt_builder, query_engine  # noqa: F401
 
-        # 加载人脸识别模型
+    def _on_resources_ready(self):
+        """资源加载完成（主线程）"""
+        self.ready = True
+        self.set_controls_enabled(True)
+        if self.model_loaded:
+            self._set_status("状态: 模型已加载", "green")
+        else:
+            self._set_status("状态: 就绪 - 请点击'启动摄像头'", "blue")
+
+        total = time.perf_counter() - STARTUP_TIME
+        phases = " | ".join(f"{name} {seconds:.2f}s" for name, seconds in self.startup_timings)
+        self.add_log(f"系统初始化完成 - OpenCV版，耗时 {total:.2f}s（{phases}）")
+
+    def _set_status(self, text, color):
+        """更新状态标签（主线程）"""
+        self.status_label.config(text=text, foreground=color)
+
+    def set_controls_enabled(self, enabled):
+        """启用/禁用依赖后台资源的按钮"""
+        state = tk.NORMAL if enabled else tk.DISABLED
+        for button in (self.start_camera_button, self.train_button, self.add_employee_button, self.query_button):
+            button.config(state=state)
+
+    def init_recognizer(self):
+        """创建识别管线（人脸检测器、运动检测、跟踪器）并加载人脸识别模型"""
+        import cv2
+        from face_tracker import create_face_tracker
+        from motion_gate import create_motion_gate
+        from overlay import TextBitmapCache
+        from recognition_pipeline import RecognitionPipeline, CONFIDENCE_MATCH
+
+        self.text_cache = TextBitmapCache(get_setting("TEXT_CACHE_SIZE", 256))
         self.face_recognizer = cv2.face.LBPHFaceRecognizer_create()
+        self.pipeline = RecognitionPipeline(self.face_recognizer, self.employee_labels, employee_names,
+                                            motion_gate=create_motion_gate(),
+                                            tracker=create_face_tracker(CONFIDENCE_MATCH))
         self.load_face_model()
 
-        # 启动日志处理线程
-        self.start_log_processor()
-
-        self.add_log("系统初始化完成 - OpenCV版")
+    def init_llm_client(self):
+        """创建复用连接的LLM API客户端（流式输出时回答边生成边显示）"""
+        from llm_client import create_llm_client
+        self.llm_client = create_llm_client(self.llm_api_url, self.llm_api_key, self.llm_model)
 
     def init_chinese_font(self):
         """初始化中文字体"""
+        from PIL import ImageFont
         try:
             # 尝试使用系统字体
             font_paths = [
@@ -112,28 +196,27 @@ class FaceAttendanceSystem:
             self.font = ImageFont.load_default()
             self.font_small = ImageFont.load_default()
 
-    def put_chinese_text(self, img, text, position, font, color=(0, 255, 0)):
-        """在OpenCV图像上绘制中文文字"""
-        # 转换为PIL图像
-        img_pil = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(img_pil)
-
-        # 绘制文字
-        draw.text(position, text, font=font, fill=color)
-
-        # 转换回OpenCV格式
-        return cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
-
     def initialize_directories(self):
         """初始化必要的目录和文件"""
+        from attendance_store import CooldownTracker, create_attendance_store, create_attendance_writer
+        from llm_cache import create_response_cache
+        from query_engine import create_query_engine
+
         # 创建faces目录
         if not os.path.exists("faces"):
             os.makedirs("faces")
 
-        # 创建attendance.csv文件（如果不存在）
-        if not os.path.exists("attendance.csv"):
-            df = pd.DataFrame(columns=["员工ID", "姓名", "日期", "时间", "签到时间"])
-            df.to_csv("attendance.csv", index=False, encoding="utf-8-sig")
+        # 打开考勤存储（默认SQLite，首次启动时导入已有的attendance.csv）
+        self.attendance_store = create_attendance_store(log=self.add_log)
+        # 恢复重启前的打卡冷却期
+        self.cooldown = CooldownTracker()
+        self.cooldown.load(self.attendance_store.last_checkins())
+        # 后台批量写入，识别线程不等待磁盘I/O
+        self.attendance_writer = create_attendance_writer(self.attendance_store, log=self.add_log)
+        # 智能问答结果缓存（数据未变化时相同问题直接返回）
+        self.response_cache = create_response_cache()
+        # 本地问答：常见的结构化问题直接查询汇总表作答
+        self.query_engine = create_query_engine(self.attendance_store, employee_names)
 
     def setup_ui(self):
         """设置用户界面"""
@@ -159,7 +242,7 @@ class FaceAttendanceSystem:
         self.stop_camera_button = ttk.Button(control_frame, text="⏸ 停止摄像头", command=self.stop_video, state=tk.DISABLED)
         self.stop_camera_button.pack(side=tk.LEFT, padx=(0, 5))
 
-        self.train_button = ttk.Button(control_frame, text="训练模型", command=self.train_face_model)
+        self.train_button = ttk.Button(control_frame, text="重建模型", command=self.train_face_model)
         self.train_button.pack(side=tk.LEFT, padx=(0, 5))
 
         self.add_employee_button = ttk.Button(control_frame, text="添加员工", command=self.add_employee)
@@ -194,8 +277,8 @@ class FaceAttendanceSystem:
         self.query_entry = ttk.Entry(input_frame, font=('Arial', 10))
         self.query_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 5))
         self.query_entry.bind('<Return>', self.on_query_submit)
-        query_button = ttk.Button(input_frame, text="查询", command=self.on_query_submit)
-        query_button.pack(side=tk.RIGHT)
+        self.query_button = ttk.Button(input_frame, text="查询", command=self.on_query_submit)
+        self.query_button.pack(side=tk.RIGHT)
 
         # 结果显示框
         result_label = ttk.Label(right_frame, text="分析结果", font=('Arial', 10, 'bold'))
@@ -222,7 +305,7 @@ class FaceAttendanceSystem:
                     for emp in employees:
                         employee_ids[emp["id"]] = emp["id"]
                         employee_names[emp["id"]] = emp["name"]
-                        self.add_log(f"已加载员工: {emp['name']}")
+                    self.add_log(f"已加载 {len(employees)} 名员工")
                     return
             except Exception as e:
                 self.add_log(f"加载员工数据失败: {str(e)}")
@@ -237,7 +320,7 @@ class FaceAttendanceSystem:
         for emp in employees:
             employee_ids[emp["id"]] = emp["id"]
             employee_names[emp["id"]] = emp["name"]
-            self.add_log(f"已加载员工: {emp['name']}")
+        self.add_log(f"已加载 {len(employees)} 名默认员工")
 
         # 保存到文件
         self.save_employees()
@@ -265,8 +348,8 @@ class FaceAttendanceSystem:
                 self.face_recognizer.read(model_file)
                 with open(labels_file, 'rb') as f:
                     self.employee_labels = pickle.load(f)
-                self.add_log("人脸识别模型加载成功")
-                self.status_label.config(text="状态: 模型已加载", foreground="green")
+                self.add_log(f"人脸识别模型加载成功 ({len(self.employee_labels)} 人)")
+                self.model_loaded = True
             except Exception as e:
                 self.add_log(f"模型加载失败: {str(e)}")
                 self.employee_labels = {}
@@ -274,84 +357,28 @@ class FaceAttendanceSystem:
             self.add_log("未找到训练好的模型，请先训练")
             self.employee_labels = {}
 
-    def train_face_model(self):
-        """训练人脸识别模型"""
-        self.add_log("开始训练人脸识别模型...")
-
-        # 获取所有员工图片
-        faces = []
-        labels = []
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.pipeline.set_model(self.face_recognizer, self.employee_labels)
+        self.pipeline.prepare_matcher(log=self.add_log)
 
-        failed_images = []
-
-        for emp_id in employee_names.keys():
-            emp_name = employee_names[emp_id]
-            image_path = f"faces/{emp_name}.jpg"
-
-            if not os.path.exists(image_path):
-                self.add_log(f"警告: 未找到 {emp_name} 的图片文件")
-                failed_images.append(emp_name)
-                continue
-
-            try:
-                # 读取图片
-                img = cv2.imread(image_path)
-                if img is None:
-                    self.add_log(f"警告: {emp_name} 的图片无法读取")
-                    failed_images.append(emp_name)
-                    continue
-
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-                # 尝试多种参数检测人脸
-                faces_detected = None
-
-                # 参数1: 标准检测
-                faces_detected = face_cascade.detectMultiScale(gray, 1.1, 4)
-
-                # 参数2: 如果失败，降低要求
-                if len(faces_detected) == 0:
-                    faces_detected = face_cascade.detectMultiScale(gray, 1.05, 3)
-
-                # 参数3: 如果还是失败，进一步降低
-                if len(faces_detected) == 0:
-                    faces_detected = face_cascade.detectMultiScale(gray, 1.02, 2, minSize=(30, 30))
-
-                if len(faces_detected) > 0:
-                    # 取最大的人脸
-                    (x, y, w, h) = max(faces_detected, key=lambda rect: rect[2] * rect[3])
-                    face_roi = gray[y:y+h, x:x+w]
-
-                    # 调整大小为统一尺寸
-                    face_roi = cv2.resize(face_roi, (200, 200))
-
-                    faces.append(face_roi)
-                    labels.append(int(emp_id))
-                    self.add_log(f"✓ 已处理 {emp_name} 的面部数据 (人脸大小: {w}x{h})")
-                else:
-                    self.add_log(f"❌ {emp_name} 的图片中未检测到人脸")
-                    failed_images.append(emp_name)
+    def train_face_model(self):
+        """完整重建人脸识别模型（新增员工会自动增量录入，一般无需重建）"""
+        from face_model import rebuild_model
 
-            except Exception as e:
-                self.add_log(f"❌ 处理 {emp_name} 时出错: {str(e)}")
-                failed_images.append(emp_name)
+        self.add_log("开始重建人脸识别模型...")
 
-        if len(faces) > 0:
-            # 训练模型
-            self.face_recognizer.train(faces, np.array(labels))
-            self.face_recognizer.save("face_model.yml")
+        employee_labels, sample_count, failed_images = rebuild_model(
+            self.face_recognizer, employee_names, log=self.add_log, lock=self.pipeline.model_lock)
 
-            # 保存标签
-            self.employee_labels = {int(emp_id): emp_id for emp_id in employee_names.keys()}
-            with open("face_labels.pkl", 'wb') as f:
-                pickle.dump(self.employee_labels, f)
+        if sample_count > 0:
+            self.employee_labels = employee_labels
+            self.pipeline.set_model(self.face_recognizer, self.employee_labels)
+            self.pipeline.prepare_matcher(log=self.add_log)
 
-            success_msg = f"模型训练完成！\n\n成功: {len(faces)} 个样本"
+            success_msg = f"模型训练完成！\n\n成功: {sample_count} 个样本"
             if failed_images:
                 success_msg += f"\n失败: {len(failed_images)} 个样本\n({', '.join(failed_images)})"
 
-            self.add_log(f"✓ 模型训练完成！共训练了 {len(faces)} 个样本")
+            self.add_log(f"✓ 模型训练完成！共训练了 {sample_count} 个样本")
             self.status_label.config(text="状态: 模型已训练", foreground="green")
             messagebox.showinfo("训练完成", success_msg)
         else:
@@ -430,7 +457,9 @@ class FaceAttendanceSystem:
                 self.save_employees()
 
                 dialog.destroy()
-                messagebox.showinfo("成功", "员工添加成功，请重新训练模型")
+
+                # 增量录入到现有模型（后台线程，避免保存大模型时界面卡顿）
+                threading.Thread(target=self.enroll_employee, args=(emp_id, name), daemon=True).start()
             except Exception as e:
                 messagebox.showerror("错误", f"保存图片失败: {str(e)}")
 
@@ -441,8 +470,36 @@ class FaceAttendanceSystem:
         ttk.Button(button_frame, text="确认", command=save_employee, width=12).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="取消", command=dialog.destroy, width=12).pack(side=tk.LEFT, padx=5)
 
+    def enroll_employee(self, emp_id, name):
+        """把新员工增量录入到现有模型（后台线程）"""
+        from face_model import enroll_employees
+
+        self.add_log(f"正在录入 {name} 的面部数据...")
+        try:
+            sample_count, failed = enroll_employees(
+                self.face_recognizer, self.employee_labels, {emp_id: name},
+                log=self.add_log, lock=self.pipeline.model_lock)
+        except Exception as e:
+            self.add_log(f"❌ 录入 {name} 失败: {str(e)}")
+            self.root.after(0, messagebox.showerror, "录入失败", f"录入失败: {str(e)}\n\n请尝试重建模型")
+            return
+
+        if sample_count > 0:
+            # 识别管线与这里共用同一个模型和标签字典，录入后立即生效
+            self.pipeline.prepare_matcher(log=self.add_log)
+            self.add_log(f"✓ {name} 已录入模型（当前 {len(self.employee_labels)} 人）")
+            self.root.after(0, lambda: self.status_label.config(text="状态: 模型已更新", foreground="green"))
+            self.root.after(0, messagebox.showinfo, "成功", f"员工 {name} 添加成功，已录入识别模型")
+        else:
+            self.root.after(0, messagebox.showwarning, "录入失败",
+                            f"员工 {name} 已添加，但图片中未检测到人脸\n\n请更换清晰的正面照片")
+
     def start_video(self):
         """启动视频流和人脸识别"""
+        import cv2
+        from frame_governor import create_frame_governor
+        from frame_grabber import create_frame_grabber
+
         if self.video_running:
             self.add_log("摄像头已在运行中")
             return
@@ -451,15 +508,16 @@ class FaceAttendanceSystem:
         self.status_label.config(text="状态: 正在启动摄像头...", foreground="orange")
 
         # 尝试打开摄像头
-        self.cap = cv2.VideoCapture(0)
+        camera_index = 0
+        self.cap = cv2.VideoCapture(camera_index)
 
         # 等待摄像头初始化
-        import time
         time.sleep(0.5)
 
         if not self.cap.isOpened():
             self.add_log("❌ 无法打开摄像头0，尝试摄像头1...")
-            self.cap = cv2.VideoCapture(1)
+            camera_index = 1
+            self.cap = cv2.VideoCapture(camera_index)
             time.sleep(0.5)
 
             if not self.cap.isOpened():
@@ -473,6 +531,13 @@ class FaceAttendanceSystem:
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 
+        # 采集与识别分开线程，识别跟不上时丢弃旧帧
+        self.frame_grabber = create_frame_grabber(self.cap, camera_index)
+        if self.frame_grabber is not None:
+            self.frame_grabber.start()
+            # 帧率调节需要采集线程：等待期间旧帧由采集线程丢弃
+            self.frame_governor = create_frame_governor(log=self.add_log)
+
         self.video_running = True
         self.video_thread = threading.Thread(target=self.video_loop, daemon=True)
         self.video_thread.start()
@@ -501,8 +566,36 @@ class FaceAttendanceSystem:
             self.cap.release()
             self.cap = None
 
+        # 采集统计（丢弃的旧帧、从采集到识别完成的延迟）
+        if self.frame_grabber is not None:
+            self.add_log(f"摄像头采集: {self.frame_grabber.summary()}")
+            self.frame_grabber = None
+        if self.frame_governor is not None:
+            self.add_log(f"帧率调节: {self.frame_governor.summary()}")
+            self.frame_governor = None
+
+        # 识别次数统计
+        self.add_log(f"人脸识别: 共 {self.pipeline.frame_count} 帧，调用识别 {self.pipeline.predict_calls} 次")
+
+        # 文字缓存统计
+        stats = self.text_cache.stats()
+        self.add_log(f"文字缓存: 命中 {stats['hits']} 次，未命中 {stats['misses']} 次 ({stats['hit_ratio']:.0%})")
+
+        # 运动门控统计
+        if self.pipeline.motion_gate is not None:
+            stats = self.pipeline.motion_gate.stats()
+            self.add_log(f"运动检测: 共 {stats['frames']} 帧，跳过人脸检测 {stats['skipped']} 帧 "
+                         f"({stats['skip_ratio']:.0%})")
+
+        # 画面显示统计
+        self.add_log(f"画面显示: 显示 {self.display_shown} 帧，界面来不及显示而跳过 {self.display_skipped} 帧")
+        with self.display_lock:
+            self.display_frame = None
+
         # 清空画布
         self.video_canvas.delete("all")
+        self.video_item = None
+        self.video_item_position = None
         self.video_canvas.create_text(
             320, 240,
             text="摄像头已停止\n点击'启动摄像头'重新开始",
@@ -517,146 +610,141 @@ class FaceAttendanceSystem:
         self.start_camera_button.config(state=tk.NORMAL)
         self.stop_camera_button.config(state=tk.DISABLED)
 
-    def record_attendance(self, emp_id, emp_name):
+    def record_attendance(self, emp_id, emp_name, timestamp=None):
         """记录考勤"""
-        now = datetime.datetime.now()
-        date_str = now.strftime("%Y-%m-%d")
+        from attendance_store import attendance_row
+
+        now = timestamp or datetime.datetime.now()
         time_str = now.strftime("%H:%M:%S")
-        datetime_str = now.strftime("%Y-%m-%d %H:%M:%S")
 
-        # 检查是否在冷却期内（5分钟）
-        if emp_id in self.last_recognition_time:
-            last_time = self.last_recognition_time[emp_id]
-            time_diff = (now - last_time).total_seconds()
-            if time_diff < 300:  # 5分钟 = 300秒
-                return False
+        # 检查是否在冷却期内（默认5分钟）
+        if self.cooldown.in_cooldown(emp_id, now):
+            return False
 
-        # 记录考勤
-        try:
-            # 追加到CSV文件（适配现有格式：员工ID,姓名,日期,时间,签到时间）
-            df = pd.DataFrame([{
-                "员工ID": emp_id,
-                "姓名": emp_name,
-                "日期": date_str,
-                "时间": time_str,
-                "签到时间": datetime_str
-            }])
-            df.to_csv("attendance.csv", mode='a', header=False, index=False, encoding="utf-8-sig")
-
-            # 更新最后识别时间
-            self.last_recognition_time[emp_id] = now
-
-            # 添加日志
-            self.add_log(f"✓ {emp_name} 打卡成功 - {time_str}")
-
-            return True
-        except Exception as e:
-            self.add_log(f"记录考勤失败: {str(e)}")
+        # 记录考勤（放入写入队列，格式：员工ID,姓名,日期,时间,签到时间）
+        if not self.attendance_writer.submit(attendance_row(emp_id, emp_name, now)):
             return False
 
+        # 更新最后识别时间
+        self.cooldown.mark(emp_id, now)
+
+        # 添加日志
+        self.add_log(f"✓ {emp_name} 打卡成功 - {time_str}")
+
+        return True
+
     def video_loop(self):
         """视频流处理循环（后台线程）"""
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        frame_count = 0
-
+        grabber = self.frame_grabber
+        governor = self.frame_governor
         while self.video_running:
-            ret, frame = self.cap.read()
-            if not ret:
+            captured = None
+            if governor is not None and not governor.wait():
                 continue
-
-            frame_count += 1
-
-            # 转换灰度图用于人脸检测
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # 使用更宽松的参数检测人脸（与训练时一致）
-            faces = face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(30, 30))
-
-            # 在画面上显示检测状态（使用中文）
-            status_text = f"检测到 {len(faces)} 个人脸"
-            frame = self.put_chinese_text(frame, status_text, (10, 10), self.font_small, (255, 255, 255))
-
-            # 显示模型状态
-            if hasattr(self, 'employee_labels') and len(self.employee_labels) > 0:
-                model_text = f"模型已加载 ({len(self.employee_labels)} 人)"
-                frame = self.put_chinese_text(frame, model_text, (10, 40), self.font_small, (255, 255, 255))
+            if grabber is not None:
+                captured = grabber.read(timeout=0.5)
+                if captured is None:
+                    continue
+                frame, timestamp = captured.frame, captured.timestamp
             else:
-                model_text = "模型未训练"
-                frame = self.put_chinese_text(frame, model_text, (10, 40), self.font_small, (0, 0, 255))
-
-            # 识别人脸
-            for (x, y, w, h) in faces:
-                # 绘制检测框
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-
-                # 人脸识别
-                if hasattr(self, 'employee_labels') and len(self.employee_labels) > 0:
-                    face_roi = gray[y:y+h, x:x+w]
-                    try:
-                        # 调整大小与训练时一致
-                        face_roi_resized = cv2.resize(face_roi, (200, 200))
-                        label, confidence = self.face_recognizer.predict(face_roi_resized)
-
-                        # 置信度阈值 (LBPH: 值越小越相似，通常 < 50 为好匹配)
-                        if confidence < 80:  # 放宽阈值
-                            emp_id = self.employee_labels.get(label)
-                            if emp_id:
-                                recognized_name = employee_names.get(emp_id, "未知")
-
-                                # 根据置信度选择颜色
-                                if confidence < 50:
-                                    color = (0, 255, 0)  # 绿色 - 高置信度
-                                    conf_text = "高"
-                                elif confidence < 65:
-                                    color = (0, 255, 255)  # 黄色 - 中等置信度
-                                    conf_text = "中"
-                                else:
-                                    color = (0, 165, 255)  # 橙色 - 低置信度
-                                    conf_text = "低"
-
-                                # 显示识别结果（使用中文）
-                                name_text = f"{recognized_name}"
-                                conf_display = f"置信度:{conf_text} ({confidence:.0f})"
-
-                                frame = self.put_chinese_text(frame, name_text, (x, y-50), self.font, color)
-                                frame = self.put_chinese_text(frame, conf_display, (x, y-20), self.font_small, color)
-
-                                # 添加调试日志（每30帧输出一次）
-                                if frame_count % 30 == 0:
-                                    self.add_log(f"识别到: {recognized_name} (ID:{emp_id}, 置信度:{confidence:.1f})")
-
-                                # 只有高置信度才记录考勤（临时降低阈值到75以便调试）
-                                if confidence < 75:  # 从65改为75，更宽松
-                                    result = self.record_attendance(emp_id, recognized_name)
-                                    if frame_count % 30 == 0 and not result:
-                                        self.add_log(f"  → 未记录考勤（可能在冷却期内）")
-                                else:
-                                    if frame_count % 30 == 0:
-                                        self.add_log(f"  → 置信度太低({confidence:.1f})，未记录考勤")
-                        else:
-                            # 置信度太低，显示未知
-                            unknown_text = f"未知 ({confidence:.0f})"
-                            frame = self.put_chinese_text(frame, unknown_text, (x, y-20), self.font_small, (0, 0, 255))
-                    except Exception as e:
-                        # 显示错误信息
-                        error_msg = f"识别错误: {str(e)}"
-                        frame = self.put_chinese_text(frame, "识别错误", (x, y-20), self.font_small, (0, 0, 255))
-                        if frame_count % 30 == 0:  # 每30帧打印一次
-                            print(error_msg)
-
-            # 将帧转换为Tkinter格式
+                ret, frame = self.cap.read()
+                if not ret:
+                    continue
+                timestamp = None
+            if governor is not None:
+                governor.begin()
+
+            # 检测、识别与打卡判定（打卡时间取采集时间）
+            result = self.pipeline.process(frame, timestamp)
+            log_this_frame = result.frame_index % 30 == 0
+
+            for detection in result.detections:
+                if detection.error and log_this_frame:  # 每30帧打印一次
+                    print(f"识别错误: {detection.error}")
+                elif detection.recognized and log_this_frame:
+                    # 添加调试日志（每30帧输出一次）
+                    self.add_log(f"识别到: {detection.name} (ID:{detection.emp_id}, 置信度:{detection.confidence:.1f})")
+                    if not detection.can_check_in:
+                        self.add_log(f"  → 置信度太低({detection.confidence:.1f})，未记录考勤")
+
+            for event in result.events:
+                recorded = self.record_attendance(event.emp_id, event.name, event.timestamp)
+                if log_this_frame and not recorded:
+                    self.add_log(f"  → 未记录考勤（可能在冷却期内）")
+            if captured is not None:
+                grabber.mark_processed(captured)
+
+            # 无界面部署可关闭画面标注
+            if self.overlay_enabled:
+                frame = self.draw_overlay(frame, result)
+
+            # 缩放并转换为RGB，交给主线程显示
             try:
-                photo = self.cv2_to_tkinter(frame)
-                if not self.frame_queue.full():
-                    self.frame_queue.put(photo)
+                self.publish_display_frame(self.prepare_display_frame(frame))
             except Exception as e:
                 print(f"转换图像时出错: {e}")
 
+            if governor is not None:
+                governor.update(len(result.detections))
+
+        # 先停止采集线程再释放摄像头
+        if grabber is not None:
+            grabber.stop()
         if self.cap:
             self.cap.release()
 
-    def cv2_to_tkinter(self, cv_frame):
-        """将OpenCV帧转换为Tkinter PhotoImage"""
+    def draw_overlay(self, frame, result):
+        """在画面上绘制检测框、识别结果和状态信息（一次性绘制）"""
+        from overlay import FrameOverlay
+        from recognition_pipeline import CONFIDENCE_MATCH
+
+        overlay = FrameOverlay(self.text_cache)
+
+        # 在画面上显示检测状态（使用中文）
+        status_text = f"检测到 {len(result.detections)} 个人脸"
+        overlay.add_text(status_text, (10, 10), self.font_small, (255, 255, 255))
+
+        # 显示模型状态
+        if result.model_loaded:
+            model_text = f"模型已加载 ({len(self.employee_labels)} 人)"
+            overlay.add_text(model_text, (10, 40), self.font_small, (255, 255, 255))
+        else:
+            overlay.add_text("模型未训练", (10, 40), self.font_small, (0, 0, 255))
+
+        for detection in result.detections:
+            x, y, w, h = detection.box
+            # 绘制检测框
+            overlay.add_box(detection.box, (0, 255, 0))
+
+            if not result.model_loaded:
+                continue
+
+            if detection.error:
+                overlay.add_text("识别错误", (x, y-20), self.font_small, (0, 0, 255))
+            elif detection.recognized:
+                # 根据置信度选择颜色
+                if detection.level == "高":
+                    color = (0, 255, 0)  # 绿色 - 高置信度
+                elif detection.level == "中":
+                    color = (0, 255, 255)  # 黄色 - 中等置信度
+                else:
+                    color = (0, 165, 255)  # 橙色 - 低置信度
+
+                # 显示识别结果（使用中文）
+                conf_display = f"置信度:{detection.level} ({detection.confidence:.0f})"
+                overlay.add_text(detection.name, (x, y-50), self.font, color)
+                overlay.add_text(conf_display, (x, y-20), self.font_small, color)
+            elif detection.confidence >= CONFIDENCE_MATCH:
+                # 置信度太低，显示未知
+                unknown_text = f"未知 ({detection.confidence:.0f})"
+                overlay.add_text(unknown_text, (x, y-20), self.font_small, (0, 0, 255))
+
+        return overlay.render(frame)
+
+    def prepare_display_frame(self, cv_frame):
+        """将OpenCV帧缩放到显示尺寸并转换为RGB（工作线程）"""
+        import cv2
+
         # 调整帧大小
         height, width = cv_frame.shape[:2]
         max_width = 640
@@ -671,33 +759,61 @@ class FaceAttendanceSystem:
         resized = cv2.resize(cv_frame, (new_width, new_height))
 
         # 转换为RGB
-        rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-
-        # 转换为PIL图像
-        pil_image = Image.fromarray(rgb)
+        return cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+
+    def publish_display_frame(self, rgb):
+        """交出待显示的帧（工作线程），主线程还没显示的上一帧直接被替换"""
+        with self.display_lock:
+            if self.display_frame is not None:
+                self.display_skipped += 1
+            self.display_frame = rgb
+
+    def show_frame(self, rgb):
+        """在画布上显示RGB帧（主线程），复用同一个PhotoImage和图像项"""
+        from PIL import Image, ImageTk
+
+        image = Image.fromarray(rgb)
+        height, width = rgb.shape[:2]
+        if self.current_photo is None or (self.current_photo.width(), self.current_photo.height()) != (width, height):
+            # 首次显示或画面尺寸变化时才创建新的PhotoImage
+            self.current_photo = ImageTk.PhotoImage(image)
+            if self.video_item is not None:
+                self.video_canvas.itemconfig(self.video_item, image=self.current_photo)
+        else:
+            self.current_photo.paste(image)
 
-        # 转换为Tkinter PhotoImage
-        return ImageTk.PhotoImage(pil_image)
+        # 计算居中位置
+        canvas_width = self.video_canvas.winfo_width()
+        canvas_height = self.video_canvas.winfo_height()
+        if canvas_width <= 1 or canvas_height <= 1:
+            return
+        position = (canvas_width // 2, canvas_height // 2)
+        if self.video_item is None:
+            # 清除"摄像头已停止"等提示
+            self.video_canvas.delete("all")
+            self.video_item = self.video_canvas.create_image(*position, image=self.current_photo, anchor=tk.CENTER)
+        elif position != self.video_item_position:
+            self.video_canvas.coords(self.video_item, *position)
+        self.video_item_position = position
+        self.display_shown += 1
 
     def update_video_display(self):
         """更新视频显示（主线程）"""
         try:
-            photo = self.frame_queue.get_nowait()
-            # 保持引用防止被垃圾回收
-            self.current_photo = photo
-            self.video_canvas.delete("all")
-            # 计算居中位置
-            canvas_width = self.video_canvas.winfo_width()
-            canvas_height = self.video_canvas.winfo_height()
-            if canvas_width > 1 and canvas_height > 1:
-                x = canvas_width // 2
-                y = canvas_height // 2
-                self.video_canvas.create_image(x, y, image=self.current_photo, anchor=tk.CENTER)
-        except queue.Empty:
-            pass
+            with self.display_lock:
+                rgb, self.display_frame = self.display_frame, None
+            if rgb is not None:
+                self.show_frame(rgb)
+        except Exception as e:
+            print(f"显示图像时出错: {e}")
         finally:
-            # 继续调度下一次更新
-            self.root.after(30, self.update_video_display)
+            # 继续调度下一次更新：刷新间隔跟随实际处理帧率，摄像头停止时降低刷新频率
+            governor = self.frame_governor
+            if governor is not None:
+                interval = governor.display_interval()
+            else:
+                interval = 30 if self.video_running else 200
+            self.root.after(interval, self.update_video_display)
 
     def add_log(self, message):
         """添加日志（线程安全）"""
@@ -728,6 +844,10 @@ class FaceAttendanceSystem:
 
     def on_query_submit(self, event=None):
         """处理查询请求"""
+        if not self.ready:
+            messagebox.showinfo("提示", "系统正在加载，请稍候")
+            return
+
         query = self.query_entry.get().strip()
         if not query:
             messagebox.showwarning("警告", "请输入问题！")
@@ -741,31 +861,40 @@ class FaceAttendanceSystem:
 
     def process_query(self, query):
         """处理LLM查询（后台线程）"""
+        from llm_cache import attendance_data_version
+        from prompt_builder import build_analysis_prompt
+
         # 显示加载状态
         self.root.after(0, self._update_result_display, "正在分析，请稍候...")
 
         try:
-            # 读取考勤数据
-            df = pd.read_csv("attendance.csv") if os.path.exists("attendance.csv") else None
-
-            # 构建Prompt
-            prompt = f"""你是一个专业的考勤数据分析助手。请根据以下考勤数据回答用户的问题。
-
-考勤数据统计：
-{df.describe().to_string() if df is not None and not df.empty else '暂无数据'}
-
-考勤明细：
-{df.to_string() if df is not None and not df.empty else '暂无数据'}
+            # 常见问题（出勤人数、未打卡名单等）在本地直接作答
+            if self.query_engine is not None:
+                answer = self.query_engine.answer(query)
+                if answer is not None:
+                    self.root.after(0, self._update_result_display, answer)
+                    return
 
-用户问题：{query}
+            # 相同问题且考勤数据未变化时直接返回缓存的回答
+            data_version = attendance_data_version(self.attendance_store, employee_names)
+            if self.response_cache is not None:
+                cached = self.response_cache.get(query, data_version, self.llm_model)
+                if cached is not None:
+                    self.root.after(0, self._update_result_display, cached)
+                    return
 
-请提供简洁、准确的分析回答。"""
+            # 构建Prompt（只选取与问题相关的汇总数据，并限制在token预算内）
+            prompt = build_analysis_prompt(self.attendance_store, query, employee_names, log=self.add_log)
 
             # 调用LLM API
-            response = self.call_llm_api(prompt)
-
-            # 显示结果
-            self.root.after(0, self._update_result_display, response)
+            if self.llm_stream:
+                response = self.stream_llm_api(prompt)
+            else:
+                response = self.call_llm_api(prompt)
+                # 显示结果
+                self.root.after(0, self._update_result_display, response)
+            if self.response_cache is not None and response:
+                self.response_cache.put(query, data_version, response, self.llm_model)
 
         except Exception as e:
             error_msg = f"查询出错: {str(e)}"
@@ -773,25 +902,20 @@ class FaceAttendanceSystem:
 
     def call_llm_api(self, prompt):
         """调用LLM API"""
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.llm_api_key}"
-        }
-
-        data = {
-            "model": self.llm_model,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2000
-        }
-
-        response = requests.post(self.llm_api_url, headers=headers, json=data, timeout=30)
-        response.raise_for_status()
-
-        result = response.json()
-        return result['choices'][0]['message']['content']
+        return self.llm_client.complete(prompt)
+
+    def stream_llm_api(self, prompt):
+        """流式调用LLM API，收到的文字逐段追加到结果区，返回完整回答"""
+        parts = []
+        for content in self.llm_client.stream(prompt):
+            if not parts:
+                # 收到第一段文字时清除"正在分析"提示
+                self.root.after(0, self._update_result_display, "")
+            parts.append(content)
+            self.root.after(0, self._append_result_text, content)
+        if not parts:
+            self.root.after(0, self._update_result_display, "未收到回答")
+        return "".join(parts)
 
     def _update_result_display(self, text):
         """更新结果显示（主线程）"""
@@ -800,11 +924,25 @@ class FaceAttendanceSystem:
         self.result_text.insert(tk.END, text)
         self.result_text.config(state=tk.DISABLED)
 
+    def _append_result_text(self, text):
+        """追加结果文字（主线程）"""
+        self.result_text.config(state=tk.NORMAL)
+        self.result_text.insert(tk.END, text)
+        self.result_text.see(tk.END)
+        self.result_text.config(state=tk.DISABLED)
+
     def on_closing(self):
         """窗口关闭处理"""
         # 停止摄像头
         if self.video_running:
             self.stop_video()
+        # 写完队列中剩余的考勤记录（后台加载未完成时部分资源可能还不存在）
+        if self.attendance_writer is not None:
+            self.attendance_writer.close()
+        if self.attendance_store is not None:
+            self.attendance_store.close()
+        if self.llm_client is not None:
+            self.llm_client.close()
         self.root.destroy()
 
 
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+离线批量考勤
+对录制的门禁视频运行与实时识别相同的 Haar + LBPH 管线，补录摄像头离线期间的考勤。
+长视频按时间切分为片段，在进程池中并行处理；所有片段合并后再按时间顺序
+应用打卡冷却期，保证结果与实时运行一致。打卡时间使用视频中的时间而不是当前时间。
+
+用法:
+    python batch_attendance.py door_0801.mp4 door_0802.mp4
+    python batch_attendance.py door.mp4 --start "2024-08-01 08:00:00" --workers 8
+    python batch_attendance.py door.mp4 --frame-step 2 --dry-run
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from attendance_store import (
+    COOLDOWN_SECONDS, CooldownTracker, attendance_row, create_attendance_store, open_attendance_store,
+)
+from recognition_pipeline import EMPLOYEES_FILE, LABELS_FILE, MODEL_FILE, load_pipeline
+
+# 默认每个片段的时长（秒）
+DEFAULT_SEGMENT_SECONDS = 300
+
+# 工作进程内的识别管线（每个进程只加载一次模型）
+_worker_pipeline = None
+
+# 主进程中加载的模型；fork方式启动时工作进程直接共享（写时复制），无需重复加载和重建索引
+_shared_pipeline = None
+
+
+def probe_video(video_path):
+    """读取视频的帧率和总帧数（部分容器和视频流读不到总帧数，返回0）"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    frame_total = max(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+    cap.release()
+    return fps, frame_total
+
+
+def video_start_time(video_path, fps, frame_total):
+    """推算视频开始时间：文件修改时间视为录制结束时间"""
+    end_time = datetime.datetime.fromtimestamp(os.path.getmtime(video_path))
+    return end_time - datetime.timedelta(seconds=frame_total / fps)
+
+
+def split_segments(frame_total, fps, segment_seconds):
+    """按时长把视频切分为 (起始帧, 结束帧) 片段"""
+    segment_frames = max(1, int(segment_seconds * fps))
+    return [(start, min(start + segment_frames, frame_total))
+            for start in range(0, frame_total, segment_frames)]
+
+
+def _init_worker(model_file, labels_file, employees_file):
+    """工作进程初始化：共享主进程的识别模型，或（spawn方式启动时）加载模型并创建批量匹配器"""
+    global _worker_pipeline
+    if _shared_pipeline is not None:
+        _worker_pipeline = _shared_pipeline.clone()
+    else:
+        _worker_pipeline = load_pipeline(model_file, labels_file, employees_file)
+
+
+def process_segment(video_path, start_frame, end_frame, fps, start_time, frame_step=1):
+    """处理视频片段（end_frame为None时读到视频结束），返回 (打卡事件列表, 已处理帧数)"""
+    pipeline = _worker_pipeline
+    pipeline.reset()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"无法打开视频: {video_path}")
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    events = []
+    processed = 0
+    frame_index = start_frame
+    try:
+        while end_frame is None or frame_index < end_frame:
+            # 跳过的帧只抓取不解码
+            if (frame_index - start_frame) % frame_step != 0:
+                if not cap.grab():
+                    break
+                frame_index += 1
+                continue
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamp = start_time + datetime.timedelta(seconds=frame_index / fps)
+            result = pipeline.process(frame, timestamp=timestamp)
+            events.extend(result.events)
+            processed += 1
+            frame_index += 1
+    finally:
+        cap.release()
+    return events, processed
+
+
+def run_batch(video_paths, start=None, segment_seconds=DEFAULT_SEGMENT_SECONDS, workers=None,
+              frame_step=1, cooldown_seconds=COOLDOWN_SECONDS,
+              model_file=MODEL_FILE, labels_file=LABELS_FILE, employees_file=EMPLOYEES_FILE):
+    """并行处理多个视频，返回冷却期过滤后的打卡事件（按时间排序）"""
+    global _shared_pipeline
+    # 在主进程中先检查模型文件，避免工作进程初始化失败
+    for path in (model_file, labels_file, employees_file):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"未找到文件: {path}")
+
+    # 在创建进程池之前加载模型和批量匹配器（含训练样本索引），工作进程不必在处理片段时各自重建
+    _shared_pipeline = load_pipeline(model_file, labels_file, employees_file, log=print)
+
+    tasks = []
+    for video_path in video_paths:
+        fps, frame_total = probe_video(video_path)
+        name = os.path.basename(video_path)
+        if frame_total <= 0:
+            # 读不到总帧数时无法切分片段，也无法由时长推算开始时间
+            if start is None:
+                print(f"❌ {name}: 无法读取总帧数，无法推算开始时间，请用 --start 指定，已跳过")
+                continue
+            print(f"⚠️ {name}: 无法读取总帧数，整个视频顺序处理（不并行）, {fps:.1f} FPS, "
+                  f"开始时间 {start:%Y-%m-%d %H:%M:%S}")
+            tasks.append((video_path, 0, None, fps, start, frame_step))
+            continue
+        start_time = start or video_start_time(video_path, fps, frame_total)
+        print(f"{name}: {frame_total} 帧, {fps:.1f} FPS, "
+              f"开始时间 {start_time:%Y-%m-%d %H:%M:%S}")
+        for start_frame, end_frame in split_segments(frame_total, fps, segment_seconds):
+            tasks.append((video_path, start_frame, end_frame, fps, start_time, frame_step))
+
+    events = []
+    processed = 0
+    begin = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_file, labels_file, employees_file)) as executor:
+        futures = [executor.submit(process_segment, *task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            segment_events, segment_frames = future.result()
+            events.extend(segment_events)
+            processed += segment_frames
+            print(f"\r进度: {done}/{len(futures)} 个片段", end="", flush=True)
+    elapsed = time.perf_counter() - begin
+    print(f"\n共处理 {processed} 帧，用时 {elapsed:.1f} 秒 ({processed / max(elapsed, 1e-6):.1f} FPS)")
+
+    # 所有片段合并后再统一应用冷却期，结果与实时运行一致
+    return CooldownTracker(cooldown_seconds).filter(events)
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="从录制视频离线补录考勤")
+    parser.add_argument("videos", nargs="+", help="视频文件路径")
+    parser.add_argument("--start", help="视频开始时间，如 \"2024-08-01 08:00:00\"（仅单个视频时可用，默认按文件修改时间推算）")
+    parser.add_argument("--segment-seconds", type=float, default=DEFAULT_SEGMENT_SECONDS, help="每个片段的时长（秒）")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数（默认CPU核数）")
+    parser.add_argument("--frame-step", type=int, default=1, help="每隔N帧处理一帧")
+    parser.add_argument("--cooldown", type=float, default=COOLDOWN_SECONDS, help="打卡冷却期（秒）")
+    parser.add_argument("--output", default=None, help="考勤文件（.csv或.db），默认使用config.py中配置的考勤存储")
+    parser.add_argument("--dry-run", action="store_true", help="只打印结果，不写入考勤记录")
+    args = parser.parse_args(argv)
+
+    start = None
+    if args.start:
+        if len(args.videos) > 1:
+            parser.error("--start 只能用于单个视频")
+        start = datetime.datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S")
+
+    try:
+        events = run_batch(args.videos, start=start, segment_seconds=args.segment_seconds,
+                           workers=args.workers, frame_step=max(1, args.frame_step),
+                           cooldown_seconds=args.cooldown)
+    except (IOError, FileNotFoundError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    for event in events:
+        print(f"✓ {event.name} ({event.emp_id}) - {event.timestamp:%Y-%m-%d %H:%M:%S} (置信度 {event.confidence:.1f})")
+    print(f"共 {len(events)} 条打卡记录")
+
+    if not args.dry_run:
+        store = open_attendance_store(args.output) if args.output else create_attendance_store()
+        try:
+            store.append([attendance_row(e.emp_id, e.name, e.timestamp) for e in events])
+        finally:
+            store.close()
+        print(f"已写入 {store.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
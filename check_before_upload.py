@@ -28,14 +28,19 @@ def check_git_files():
         'config.py',  # 包含真实API密钥
         'employees.json',  # 员工数据
         'attendance.csv',  # 考勤记录
+        'attendance.db',  # 考勤数据库
+        'llm_cache.json',  # 智能问答缓存（包含考勤分析结果）
         'face_model.yml',  # 训练好的模型
         'face_labels.pkl'  # 模型标签
     ]
 
     # 注意：config.example.py 和 setup_config.py 应该上传
     
+    # 敏感文件后缀
+    sensitive_suffixes = ['.last_checkin.json']  # CSV考勤的最后打卡时间索引
+
     # 敏感目录
-    sensitive_dirs = ['faces/']
+    sensitive_dirs = ['faces/', 'roi_cache/']
     
     found_sensitive = []
     
@@ -43,6 +48,8 @@ def check_git_files():
         # 检查敏感文件（精确匹配，避免误判）
         if file in sensitive_files:
             found_sensitive.append(file)
+        elif any(file.endswith(suffix) for suffix in sensitive_suffixes):
+            found_sensitive.append(file)
 
         # 检查敏感目录（排除.gitkeep）
         if any(file.startswith(sd) for sd in sensitive_dirs):
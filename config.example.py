@@ -12,3 +12,98 @@ LLM_API_URL = "https://api.deepseek.com/v1/chat/completions"  # 或其他API地
 LLM_API_KEY = "YOUR_API_KEY_HERE"  # 在这里填写您的API密钥
 LLM_MODEL = "deepseek-chat"  # 模型名称
 
+
+# 摄像头配置（多摄像头模式 multi_camera.py 使用）
+# 可以是设备索引（0, 1, ...）或视频文件/RTSP地址
+CAMERA_SOURCES = [0]
+
+# 运动检测门控：画面静止时跳过人脸检测，降低CPU占用
+MOTION_GATE_ENABLED = True
+MOTION_THRESHOLD = 25      # 像素灰度变化阈值，越小越灵敏
+MOTION_MIN_AREA = 0.002    # 运动像素占检测区域的最小比例，越小越灵敏
+MOTION_ZONE = None         # 只在该区域判断运动：矩形 (x, y, w, h) 或多边形 [(x, y), ...]
+MOTION_HOLD_FRAMES = 15    # 检测到运动或人脸后继续检测的帧数
+
+# 人脸跟踪：同一人连续出现时只定期复核身份，每条轨迹只打卡一次
+TRACKER_ENABLED = True
+TRACK_MIN_PREDICTIONS = 3      # 轨迹建立后连续识别的次数（融合后确认身份）
+TRACK_REVERIFY_INTERVAL = 15   # 身份确认后每隔多少帧复核一次
+
+# 一帧中的所有人脸一次批量匹配（NumPy矩阵计算，结果与逐个识别相同，训练样本多时明显更快）
+BATCH_MATCHING = True
+# 训练样本数达到该值时建立索引，只精确比较相近的样本（None表示始终逐一比较）
+GALLERY_INDEX_MIN_SAMPLES = 20000
+GALLERY_INDEX_PROBES = 8       # 搜索的簇数，越大越准、越慢（python gallery_index.py 对比召回率和耗时）
+GALLERY_INDEX_LISTS = None     # 簇数，None为 4 * sqrt(样本数)
+GALLERY_INDEX_DIMS = 64        # 聚类前降维后的维数
+# 内存：每个训练样本的直方图有16384维。识别模型本身保存一份float32（64KB/样本），
+# 批量匹配器另存一份float32直方图（64KB/样本）和一份开平方的副本：
+# 不建索引时为float32（64KB/样本），建立索引后为float16（32KB/样本）。
+# 例如3万个样本：模型约2GB + 匹配器约2GB + 开平方副本约1GB（float32时约2GB）
+GALLERY_SQRT_FLOAT16 = True    # 建立索引后开平方的副本以半精度存储，False时多占一半内存，计算下界约快3倍
+
+# 摄像头画面在独立线程中采集，识别只处理最新的一帧（跟不上时丢弃旧帧，避免画面和打卡延迟越积越大）
+CAPTURE_THREAD = True
+FRAME_BUFFER_SIZE = 2          # 采集缓冲区保留的帧数
+
+# 自适应帧率（需要CAPTURE_THREAD）：无人时降低处理帧率，减少空闲时的CPU占用和发热
+FRAME_GOVERNOR_ENABLED = True
+ACTIVE_FPS = 15                # 有人时的最高处理帧率
+IDLE_FPS = 2                   # 空闲模式的处理帧率
+IDLE_AFTER = 10                # 连续多少秒没有检测到人脸后进入空闲模式
+CPU_BUDGET = 0.6               # 处理线程最多占用单核CPU的比例，None表示不限制
+
+# 画面标注（检测框、姓名等），无界面部署时可关闭以节省CPU
+OVERLAY_ENABLED = True
+TEXT_CACHE_SIZE = 256      # 文字位图缓存条数
+
+# 人脸检测配置（训练和实时识别使用相同的后端参数）
+DETECTOR_BACKEND = "haar"      # 检测后端: haar（默认）/ lbp（更快）/ yunet（DNN，需要模型文件）
+DETECTOR_MODEL = None          # LBP级联或YuNet ONNX模型文件路径，None使用OpenCV自带的级联文件
+DETECT_SCALE_FACTOR = 1.1      # 级联检测的缩放步长
+DETECT_MIN_NEIGHBORS = 4       # 级联检测的最少邻近框数
+DETECT_SCORE_THRESHOLD = 0.9   # YuNet置信度阈值
+DETECT_SCALE = 1.0             # 检测前缩放比例，如0.5表示在一半分辨率上检测（更快）
+DETECT_ROI = None              # 只在该区域检测：矩形 (x, y, w, h) 或多边形 [(x, y), ...]
+FACE_MIN_SIZE = (30, 30)       # 最小人脸尺寸（像素），录入照片时同样适用
+FACE_MAX_SIZE = None           # 最大人脸尺寸（像素），录入照片时同样适用
+FACE_DISTANCE_RANGE = None     # 人脸与摄像头的距离范围（米），如 (0.5, 2.5)，设置后自动推算人脸尺寸范围
+CAMERA_HFOV = 60               # 摄像头水平视场角（度）
+
+# 考勤存储：sqlite（默认，首次启动时自动导入已有的attendance.csv）或 csv
+ATTENDANCE_BACKEND = "sqlite"
+ATTENDANCE_DB = "attendance.db"
+ATTENDANCE_FILE = "attendance.csv"
+
+# 考勤后台写入（组提交）
+WRITER_BATCH_SIZE = 32     # 每批最多写入的记录数
+WRITER_FLUSH_MS = 200      # 最长等待时间（毫秒），到时即写入
+WRITER_QUEUE_SIZE = 1000   # 写入队列长度
+WRITER_FSYNC = "batch"     # 刷盘策略: batch（每批）/ interval（定时）/ none（交给系统）
+WRITER_FSYNC_INTERVAL = 5.0  # interval策略的刷盘间隔（秒），断电时最多丢失这段时间内的记录
+
+# 同一员工两次打卡的最小间隔（秒）
+COOLDOWN_SECONDS = 300
+
+# 智能问答提示词中各汇总表的范围
+PROMPT_HEADCOUNT_DAYS = 31     # 每日出勤人数（天）
+PROMPT_DAILY_DAYS = 7          # 员工每日首次/最后打卡（天）
+PROMPT_MONTHS = 3              # 员工月度汇总（月）
+PROMPT_MAX_TABLE_ROWS = 300    # 每张表最多行数
+
+# 智能问答结果缓存（相同问题在考勤数据未变化时直接返回上次的回答）
+LLM_CACHE_ENABLED = True
+LLM_CACHE_FILE = "llm_cache.json"
+LLM_CACHE_SIZE = 200           # 最多缓存的回答条数
+LLM_CACHE_TTL = 24 * 3600      # 回答有效期（秒）
+
+# LLM API连接
+LLM_STREAM = True          # 流式输出，回答边生成边显示
+LLM_TIMEOUT = 30           # 连接超时及两次读取之间的最长等待（秒）
+LLM_MAX_RETRIES = 3        # 连接失败或429/5xx时的重试次数
+LLM_RETRY_BACKOFF = 0.5    # 重试退避基数（秒），每次重试等待时间翻倍
+
+# 本地问答：出勤人数、未打卡名单、个人打卡记录、最早/最晚到达等问题直接查询作答，不调用LLM
+LOCAL_QUERY_ENABLED = True
+PROMPT_TOKEN_BUDGET = 4000     # 考勤数据部分的token预算，超出时截断并在提示词中注明
+PROMPT_EMPLOYEE_DAYS = 31      # 问题涉及员工但未指定日期时，提供最近多少天的数据
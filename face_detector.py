@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+"""
+人脸检测
+可选的检测后端（均随OpenCV提供，离线可用）：
+- haar:  Haar级联（默认）
+- lbp:   LBP级联，比Haar快，误检略多
+- yunet: cv2.FaceDetectorYN（DNN），需要在config.py中指定本地模型文件 DETECTOR_MODEL
+
+所有后端都支持：
+- 在缩小的图像上检测，再把人脸框映射回原始分辨率（用于截取200x200的ROI）
+- 只在指定区域（矩形或多边形，如门口）内检测
+- 根据人脸与摄像头的距离范围推算 minSize / maxSize
+
+训练（face_model）和实时识别使用同一组后端参数（detector_settings），
+检测器每个进程只加载一次（get_face_detector / get_training_detector）。
+
+对比各后端的速度和检出率（图片目录中每张图片应包含一张人脸，如 faces/）:
+    python face_detector.py faces/ --backends haar lbp yunet
+"""
+
+import argparse
+import glob
+import math
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from app_config import get_setting
+
+# 成年人脸的平均宽度（米）
+FACE_WIDTH_METERS = 0.16
+
+DETECTOR_BACKENDS = ("haar", "lbp", "yunet")
+HAAR_CASCADE = "haarcascade_frontalface_default.xml"
+LBP_CASCADE = "lbpcascade_frontalface_improved.xml"
+
+# 录入照片中未检测到人脸时依次放宽的级联参数（第一遍总是使用与实时识别相同的参数，人脸尺寸范围始终不变）
+CASCADE_FALLBACK_PASSES = [
+    {"scale_factor": 1.05, "min_neighbors": 3},
+    {"scale_factor": 1.02, "min_neighbors": 2},
+]
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def face_size_range(frame_width, hfov_degrees, min_distance, max_distance, face_width=FACE_WIDTH_METERS):
+    """根据距离范围推算人脸在画面中的像素宽度范围，返回 (最小, 最大)"""
+    # 距离d处画面覆盖的宽度为 2 * d * tan(hfov / 2)
+    half_fov = math.tan(math.radians(hfov_degrees) / 2)
+
+    def pixels_at(distance):
+        return face_width / (2 * distance * half_fov) * frame_width
+
+    # 留出20%余量，避免边界附近漏检
+    return int(pixels_at(max_distance) * 0.8), int(math.ceil(pixels_at(min_distance) * 1.25))
+
+
+def find_cascade(filename):
+    """查找OpenCV自带的级联文件（pip版只带haarcascades，LBP级联需在系统OpenCV数据目录中）"""
+    candidates = [os.path.join(cv2.data.haarcascades, filename)]
+    base = os.path.dirname(os.path.normpath(cv2.data.haarcascades))
+    candidates.append(os.path.join(base, "lbpcascades", filename))
+    for prefix in ("/usr/share/opencv4", "/usr/local/share/opencv4", "/usr/share/opencv"):
+        candidates.append(os.path.join(prefix, "lbpcascades", filename))
+        candidates.append(os.path.join(prefix, "haarcascades", filename))
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"未找到级联文件 {filename}，请在config.py中用 DETECTOR_MODEL 指定路径")
+
+
+class FaceDetector:
+    """人脸检测器基类：检测区域、缩放和人脸尺寸范围，子类实现 _detect_image"""
+
+    name = ""
+
+    def __init__(self, min_size=(30, 30), max_size=None, detect_scale=1.0, roi=None,
+                 distance_range=None, hfov=60):
+        """
+        detect_scale: 检测前的缩放比例（如0.5表示在一半分辨率上检测）
+        roi: 检测区域，矩形 (x, y, w, h) 或多边形 [(x, y), ...]，None为整个画面
+        distance_range: 人脸与摄像头的距离范围 (最近, 最远)，单位米；设置后自动推算min_size/max_size
+        hfov: 摄像头水平视场角（度）
+        """
+        self.min_size = tuple(min_size) if min_size else None
+        self.max_size = tuple(max_size) if max_size else None
+        self.detect_scale = detect_scale
+        self.distance_range = distance_range
+        self.hfov = hfov
+
+        self.roi_rect = None
+        self.roi_polygon = None
+        if roi is not None:
+            if isinstance(roi[0], (list, tuple)):
+                self.roi_polygon = np.array(roi, dtype=np.float32)
+                x, y, w, h = cv2.boundingRect(self.roi_polygon)
+                self.roi_rect = (x, y, w, h)
+            else:
+                self.roi_rect = tuple(int(v) for v in roi)
+
+        self._sized_for_width = None
+
+    def signature(self):
+        """影响检测结果的参数（用于训练ROI缓存的键）"""
+        return (self.name, self.min_size, self.max_size, self.detect_scale, self.roi_rect)
+
+    def _update_size_range(self, frame_width):
+        """按实际画面宽度推算人脸尺寸范围（只计算一次）"""
+        if self.distance_range is None or self._sized_for_width == frame_width:
+            return
+        min_px, max_px = face_size_range(frame_width, self.hfov, *self.distance_range)
+        self.min_size = (max(min_px, 20), max(min_px, 20))
+        self.max_size = (max_px, max_px)
+        self._sized_for_width = frame_width
+
+    def _crop(self, image):
+        """截取检测区域，返回 (图像, x偏移, y偏移)"""
+        if self.roi_rect is None:
+            return image, 0, 0
+        height, width = image.shape[:2]
+        x, y, w, h = self.roi_rect
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, width), min(y + h, height)
+        return image[y0:y1, x0:x1], x0, y0
+
+    def _scaled_size(self, size):
+        if not size:
+            return None
+        return tuple(max(1, int(v * self.detect_scale)) for v in size)
+
+    def _detect_image(self, gray, color, min_size, max_size, **overrides):
+        """在（已截取、缩放的）图像上检测，返回 (x, y, w, h) 列表；color为对应的BGR图像或None"""
+        raise NotImplementedError
+
+    def detect(self, gray, frame=None, **overrides):
+        """
+        检测人脸，返回原始分辨率下的 (x, y, w, h) 列表
+        frame: 对应的BGR图像（DNN后端使用，未提供时由灰度图转换）
+        """
+        self._update_size_range(gray.shape[1])
+        image, offset_x, offset_y = self._crop(gray)
+        if image.size == 0:
+            return []
+        color = self._crop(frame)[0] if frame is not None else None
+
+        if self.detect_scale != 1.0:
+            image = cv2.resize(image, None, fx=self.detect_scale, fy=self.detect_scale,
+                               interpolation=cv2.INTER_AREA)
+            if color is not None:
+                color = cv2.resize(color, None, fx=self.detect_scale, fy=self.detect_scale,
+                                   interpolation=cv2.INTER_AREA)
+
+        faces = self._detect_image(image, color, self._scaled_size(self.min_size),
+                                   self._scaled_size(self.max_size), **overrides)
+
+        boxes = []
+        for (x, y, w, h) in faces:
+            # 映射回原始分辨率
+            box = (int(x / self.detect_scale) + offset_x, int(y / self.detect_scale) + offset_y,
+                   int(w / self.detect_scale), int(h / self.detect_scale))
+            if self.roi_polygon is not None:
+                center = (box[0] + box[2] / 2, box[1] + box[3] / 2)
+                if cv2.pointPolygonTest(self.roi_polygon, center, False) < 0:
+                    continue
+            boxes.append(box)
+        return boxes
+
+    def fallback_passes(self):
+        """录入照片未检测到人脸时依次尝试的放宽参数"""
+        return []
+
+    def detect_largest(self, gray, frame=None):
+        """检测最大的人脸（录入照片使用），先用标准参数，失败时依次放宽；未检测到返回None"""
+        for overrides in [{}] + self.fallback_passes():
+            boxes = self.detect(gray, frame, **overrides)
+            if boxes:
+                return max(boxes, key=lambda box: box[2] * box[3])
+        return None
+
+
+class CascadeFaceDetector(FaceDetector):
+    """级联分类器人脸检测器（Haar / LBP）"""
+
+    def __init__(self, cascade_path, scale_factor=1.1, min_neighbors=4, **geometry):
+        super().__init__(**geometry)
+        self.cascade_path = cascade_path
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise FileNotFoundError(f"无法加载级联文件: {cascade_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def signature(self):
+        return super().signature() + (os.path.basename(self.cascade_path), self.scale_factor,
+                                      self.min_neighbors, CASCADE_FALLBACK_PASSES)
+
+    def fallback_passes(self):
+        return CASCADE_FALLBACK_PASSES
+
+    def _detect_image(self, gray, color, min_size, max_size, scale_factor=None, min_neighbors=None, **overrides):
+        kwargs = {}
+        if min_size:
+            kwargs["minSize"] = tuple(min_size)
+        if max_size:
+            kwargs["maxSize"] = max_size
+        return self.cascade.detectMultiScale(gray, scale_factor or self.scale_factor,
+                                             min_neighbors or self.min_neighbors, **kwargs)
+
+
+class HaarFaceDetector(CascadeFaceDetector):
+    """Haar级联人脸检测器"""
+
+    name = "haar"
+
+    def __init__(self, cascade_path=None, scale_factor=1.1, min_neighbors=4, **geometry):
+        super().__init__(cascade_path or find_cascade(HAAR_CASCADE), scale_factor, min_neighbors, **geometry)
+
+
+class LbpFaceDetector(CascadeFaceDetector):
+    """LBP级联人脸检测器（比Haar快，适合低性能设备）"""
+
+    name = "lbp"
+
+    def __init__(self, cascade_path=None, scale_factor=1.1, min_neighbors=4, **geometry):
+        super().__init__(cascade_path or find_cascade(LBP_CASCADE), scale_factor, min_neighbors, **geometry)
+
+
+class YuNetFaceDetector(FaceDetector):
+    """cv2.FaceDetectorYN（YuNet DNN）人脸检测器，需要本地ONNX模型文件"""
+
+    name = "yunet"
+
+    def __init__(self, model_path, score_threshold=0.9, nms_threshold=0.3, top_k=50, **geometry):
+        super().__init__(**geometry)
+        if not model_path or not os.path.exists(model_path):
+            raise FileNotFoundError(f"未找到YuNet模型文件: {model_path}（请在config.py中设置 DETECTOR_MODEL）")
+        self.model_path = model_path
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold, nms_threshold, top_k)
+        self._input_size = None
+        # FaceDetectorYN不是线程安全的
+        self._lock = threading.Lock()
+
+    def signature(self):
+        return super().signature() + (os.path.basename(self.model_path), self.score_threshold,
+                                      self.nms_threshold)
+
+    def _detect_image(self, gray, color, min_size, max_size, **overrides):
+        if color is None:
+            color = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        height, width = color.shape[:2]
+        with self._lock:
+            if self._input_size != (width, height):
+                self.detector.setInputSize((width, height))
+                self._input_size = (width, height)
+            _, faces = self.detector.detect(color)
+        if faces is None:
+            return []
+
+        boxes = []
+        for face in faces:
+            x, y, w, h = (int(round(v)) for v in face[:4])
+            # 裁剪到图像范围内
+            x0, y0 = max(x, 0), max(y, 0)
+            w, h = min(x + w, width) - x0, min(y + h, height) - y0
+            if w <= 0 or h <= 0:
+                continue
+            if min_size and (w < min_size[0] or h < min_size[1]):
+                continue
+            if max_size and (w > max_size[0] or h > max_size[1]):
+                continue
+            boxes.append((x0, y0, w, h))
+        return boxes
+
+
+def detector_settings():
+    """训练和实时识别共用的检测后端参数"""
+    return {
+        "backend": get_setting("DETECTOR_BACKEND", "haar"),
+        "model_path": get_setting("DETECTOR_MODEL", None),
+        "scale_factor": get_setting("DETECT_SCALE_FACTOR", 1.1),
+        "min_neighbors": get_setting("DETECT_MIN_NEIGHBORS", 4),
+        "score_threshold": get_setting("DETECT_SCORE_THRESHOLD", 0.9),
+    }
+
+
+def face_size_limits():
+    """训练和实时识别共用的人脸尺寸范围（FACE_MIN_SIZE / FACE_MAX_SIZE）"""
+    return {
+        "min_size": get_setting("FACE_MIN_SIZE", (30, 30)),
+        "max_size": get_setting("FACE_MAX_SIZE", None),
+    }
+
+
+def camera_geometry():
+    """实时识别的画面相关参数（检测区域、缩放、人脸尺寸范围），录入照片只使用人脸尺寸范围"""
+    return {
+        **face_size_limits(),
+        "detect_scale": get_setting("DETECT_SCALE", 1.0),
+        "roi": get_setting("DETECT_ROI", None),
+        "distance_range": get_setting("FACE_DISTANCE_RANGE", None),
+        "hfov": get_setting("CAMERA_HFOV", 60),
+    }
+
+
+def build_detector(backend="haar", model_path=None, scale_factor=1.1, min_neighbors=4, score_threshold=0.9,
+                   **geometry):
+    """按后端名称创建检测器"""
+    if backend == "haar":
+        return HaarFaceDetector(model_path, scale_factor, min_neighbors, **geometry)
+    if backend == "lbp":
+        return LbpFaceDetector(model_path, scale_factor, min_neighbors, **geometry)
+    if backend == "yunet":
+        return YuNetFaceDetector(model_path, score_threshold, **geometry)
+    raise ValueError(f"未知的检测后端: {backend}（可选: {', '.join(DETECTOR_BACKENDS)}）")
+
+
+def create_face_detector():
+    """根据config.py创建实时识别用的人脸检测器"""
+    return build_detector(**detector_settings(), **camera_geometry())
+
+
+def create_training_detector():
+    """根据config.py创建录入照片用的人脸检测器（后端参数和人脸尺寸范围与实时识别相同，不限制检测区域）"""
+    return build_detector(**detector_settings(), **face_size_limits())
+
+
+# 进程内共用的检测器
+_shared_detectors = {}
+_shared_lock = threading.Lock()
+
+
+def _get_shared(kind, factory):
+    with _shared_lock:
+        detector = _shared_detectors.get(kind)
+        if detector is None:
+            detector = _shared_detectors[kind] = factory()
+        return detector
+
+
+def get_face_detector():
+    """获取当前进程共用的实时识别检测器（只加载一次）"""
+    return _get_shared("live", create_face_detector)
+
+
+def get_training_detector():
+    """获取当前进程共用的录入照片检测器（只加载一次）"""
+    return _get_shared("training", create_training_detector)
+
+
+def compare_backends(image_dir, backends, model_paths=None, repeat=1, log=print):
+    """
+    在图片目录上对比各检测后端，每张图片应包含一张人脸
+    model_paths: {后端: 级联/模型文件路径}，未指定的后端使用默认文件
+    返回 {后端: {"images", "detected", "recall", "fps", "ms"}}
+    """
+    paths = sorted(p for p in glob.glob(os.path.join(image_dir, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+    images = []
+    for path in paths:
+        img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is not None:
+            images.append((img, cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)))
+    if not images:
+        raise FileNotFoundError(f"{image_dir} 中没有可读取的图片")
+
+    settings = detector_settings()
+    model_paths = model_paths or {}
+    results = {}
+    for backend in backends:
+        try:
+            detector = build_detector(**{**settings, "backend": backend, "model_path": model_paths.get(backend)})
+        except (FileNotFoundError, ValueError, cv2.error) as e:
+            log(f"跳过 {backend}: {e}")
+            continue
+
+        detected = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            detected = sum(1 for img, gray in images if detector.detect(gray, img))
+        elapsed = time.perf_counter() - start
+        count = len(images) * repeat
+        results[backend] = {
+            "images": len(images),
+            "detected": detected,
+            "recall": detected / len(images),
+            "fps": count / elapsed if elapsed else float("inf"),
+            "ms": elapsed * 1000 / count,
+        }
+    return results
+
+
+def main(argv=None):
+    """命令行入口：对比检测后端"""
+    parser = argparse.ArgumentParser(description="对比人脸检测后端的速度和检出率")
+    parser.add_argument("images", help="图片目录（每张图片应包含一张人脸，如 faces/）")
+    parser.add_argument("--backends", nargs="+", default=list(DETECTOR_BACKENDS), choices=DETECTOR_BACKENDS,
+                        help="要对比的后端")
+    parser.add_argument("--lbp-cascade", default=None, help="LBP级联文件路径（默认在OpenCV数据目录中查找）")
+    parser.add_argument("--yunet-model", default=None, help="YuNet ONNX模型文件路径")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数（使计时更稳定）")
+    args = parser.parse_args(argv)
+
+    settings = detector_settings()
+    if settings["backend"] not in DETECTOR_BACKENDS:
+        print(f"❌ config.py 中 DETECTOR_BACKEND = {settings['backend']!r} 无效（可选: {', '.join(DETECTOR_BACKENDS)}）")
+        return 1
+    model_paths = {"lbp": args.lbp_cascade, "yunet": args.yunet_model}
+    if settings["backend"] != "haar" and not model_paths[settings["backend"]]:
+        model_paths[settings["backend"]] = settings["model_path"]
+
+    try:
+        results = compare_backends(args.images, args.backends, model_paths, max(1, args.repeat))
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return 1
+    if not results:
+        print("❌ 没有可用的检测后端")
+        return 1
+
+    print(f"{'后端':<8}{'检出':>10}{'检出率':>10}{'FPS':>10}{'毫秒/张':>10}")
+    for backend, stats in results.items():
+        print(f"{backend:<8}{stats['detected']:>6}/{stats['images']:<4}{stats['recall']:>9.1%}"
+              f"{stats['fps']:>10.1f}{stats['ms']:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
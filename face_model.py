@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+人脸识别模型训练
+- rebuild_model: 读取faces/目录中所有员工图片，从头训练（完整重建，用于维护）
+- enroll_employees: 只处理新员工的图片，用LBPH的update()追加到现有模型（增量录入）
+
+人脸ROI提取在进程池中并行执行，提取结果按"图片内容哈希 + 检测参数"缓存到 roi_cache/，
+重新训练时只有新增或修改过的图片才需要重新检测。
+人脸检测与实时识别使用同一个检测后端、参数和人脸尺寸范围（见face_detector.detector_settings、face_size_limits）。
+"""
+
+import hashlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import cv2
+import numpy as np
+
+from face_detector import get_training_detector
+from recognition_pipeline import FACE_SIZE, LABELS_FILE, MODEL_FILE
+
+# 人脸ROI缓存目录
+ROI_CACHE_DIR = "roi_cache"
+
+# 图片数量达到该值才使用进程池（少量图片时进程启动开销更大）
+PARALLEL_MIN_IMAGES = 8
+
+def employee_image_path(emp_name):
+    """员工面部图片路径"""
+    return f"faces/{emp_name}.jpg"
+
+
+def detect_face_roi(img, detector):
+    """截取图片中最大的人脸，返回 (200x200灰度ROI, (w, h))；未检测到人脸返回None"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    box = detector.detect_largest(gray, img)
+    if box is None:
+        return None
+    x, y, w, h = box
+    # 调整大小为统一尺寸
+    return cv2.resize(gray[y:y+h, x:x+w], FACE_SIZE), (int(w), int(h))
+
+
+def roi_cache_key(image_data, detector):
+    """缓存键：图片内容 + 检测参数，参数或检测后端变化后旧缓存自动失效"""
+    params = repr((detector.signature(), FACE_SIZE))
+    return hashlib.sha1(image_data + params.encode("utf-8")).hexdigest()
+
+
+def extract_face_roi_cached(image_path, cache_dir=ROI_CACHE_DIR):
+    """提取人脸ROI（带缓存），返回 (detect_face_roi的结果, 是否命中缓存)"""
+    with open(image_path, 'rb') as f:
+        image_data = f.read()
+    detector = get_training_detector()
+    cache_path = os.path.join(cache_dir, roi_cache_key(image_data, detector) + ".npz")
+
+    if os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as cached:
+                roi = cached["roi"]
+                size = tuple(int(v) for v in cached["size"])
+            # 空ROI表示该图片中未检测到人脸
+            return ((roi, size) if roi.size else None), True
+        except Exception:
+            pass  # 缓存文件损坏时重新检测
+
+    img = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("图片无法读取")
+    extracted = detect_face_roi(img, detector)
+
+    roi, size = extracted if extracted is not None else (np.zeros((0, 0), dtype=np.uint8), (0, 0))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, roi=roi, size=np.array(size))
+    os.replace(tmp_path, cache_path)
+    return extracted, False
+
+
+def _extract_job(job):
+    """进程池任务：提取一名员工的人脸ROI"""
+    emp_id, emp_name, image_path = job
+    try:
+        extracted, cached = extract_face_roi_cached(image_path)
+        return emp_id, emp_name, extracted, cached, None
+    except Exception as e:
+        return emp_id, emp_name, None, False, str(e)
+
+
+def collect_samples(employees, log=print, workers=None):
+    """
+    提取员工的训练样本，employees为 {员工ID: 姓名}
+    workers为进程数（默认CPU核数，1表示不使用进程池）
+    返回 (人脸列表, 标签列表, 失败的姓名列表)
+    """
+    faces = []
+    labels = []
+    failed = []
+
+    jobs = []
+    for emp_id, emp_name in employees.items():
+        image_path = employee_image_path(emp_name)
+        if not os.path.exists(image_path):
+            log(f"警告: 未找到 {emp_name} 的图片文件")
+            failed.append(emp_name)
+            continue
+        jobs.append((emp_id, emp_name, image_path))
+
+    if len(jobs) >= PARALLEL_MIN_IMAGES and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_extract_job, jobs, chunksize=16))
+    else:
+        results = [_extract_job(job) for job in jobs]
+
+    cache_hits = 0
+    for emp_id, emp_name, extracted, cached, error in results:
+        cache_hits += cached
+        if error:
+            log(f"❌ 处理 {emp_name} 时出错: {error}")
+            failed.append(emp_name)
+            continue
+
+        if extracted is None:
+            log(f"❌ {emp_name} 的图片中未检测到人脸")
+            failed.append(emp_name)
+            continue
+
+        face_roi, (w, h) = extracted
+        faces.append(face_roi)
+        labels.append(int(emp_id))
+        log(f"✓ 已处理 {emp_name} 的面部数据 (人脸大小: {w}x{h})")
+
+    if jobs:
+        log(f"人脸提取: 缓存命中 {cache_hits} 张，重新检测 {len(jobs) - cache_hits} 张")
+    return faces, labels, failed
+
+
+def save_model(face_recognizer, employee_labels, model_file=MODEL_FILE, labels_file=LABELS_FILE):
+    """保存模型和标签"""
+    face_recognizer.save(model_file)
+    with open(labels_file, 'wb') as f:
+        pickle.dump(employee_labels, f)
+
+
+def rebuild_model(face_recognizer, employee_names, log=print, lock=None):
+    """
+    完整重建：用所有员工图片从头训练
+    lock用于与实时识别线程互斥
+    返回 (标签字典, 样本数, 失败的姓名列表)
+    """
+    faces, labels, failed = collect_samples(employee_names, log)
+    if not faces:
+        return None, 0, failed
+
+    with lock or nullcontext():
+        face_recognizer.train(faces, np.array(labels))
+    employee_labels = {int(emp_id): emp_id for emp_id in employee_names.keys()}
+    save_model(face_recognizer, employee_labels)
+    return employee_labels, len(faces), failed
+
+
+def enroll_employees(face_recognizer, employee_labels, employees, log=print, lock=None):
+    """
+    增量录入：只处理新员工的图片，追加到现有模型
+    employees为 {员工ID: 姓名}；lock用于与实时识别线程互斥
+    返回 (新增样本数, 失败的姓名列表)
+    """
+    faces, labels, failed = collect_samples(employees, log)
+    if not faces:
+        return 0, failed
+
+    replaced = [emp_id for emp_id in employees if int(emp_id) in employee_labels]
+    if replaced:
+        log(f"注意: {', '.join(replaced)} 已在模型中，旧样本会保留，如需移除请重建模型")
+
+    with lock or nullcontext():
+        face_recognizer.update(faces, np.array(labels))
+    for emp_id in employees:
+        if int(emp_id) in labels:
+            employee_labels[int(emp_id)] = emp_id
+
+    save_model(face_recognizer, employee_labels)
+    return len(faces), failed
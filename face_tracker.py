@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+人脸跟踪
+按IoU/中心点距离把相邻帧的人脸框关联成轨迹。每条轨迹在建立时连续识别几次，
+确认身份后只定期复核；多次识别结果按置信度加权融合，每条轨迹只产生一次打卡。
+人在摄像头前停留时，LBPH predict 的调用次数可以减少一个数量级。
+"""
+
+from app_config import get_setting
+
+
+def box_iou(a, b):
+    """两个 (x, y, w, h) 框的交并比"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def center_distance(a, b):
+    """两个框中心点距离相对框尺寸的比例"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    dx = (ax + aw / 2) - (bx + bw / 2)
+    dy = (ay + ah / 2) - (by + bh / 2)
+    return (dx * dx + dy * dy) ** 0.5 / max(aw, ah, bw, bh, 1)
+
+
+class FaceTrack:
+    """一条人脸轨迹及其身份融合结果"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.age = 0                 # 轨迹存在的帧数
+        self.missed = 0              # 连续未匹配的帧数
+        self.frames_since_verify = 0
+        self.predictions = 0         # 已识别次数
+        self.scores = {}             # 标签 -> 累计权重
+        self.distances = {}          # 标签 -> [LBPH距离]
+        self.checked_in = set()      # 本轨迹已打卡的员工ID
+
+        # 融合后的身份
+        self.label = None
+        self.confidence = None
+
+    def add_prediction(self, label, confidence, match_threshold):
+        """加入一次识别结果并重新融合身份"""
+        self.predictions += 1
+        self.frames_since_verify = 0
+        if confidence >= match_threshold:
+            # 不匹配的结果不投票给任何标签，但会拉低整体置信
+            label = None
+        weight = max(match_threshold - confidence, 1e-3) if label is not None else 1.0
+        self.scores[label] = self.scores.get(label, 0.0) + weight
+        self.distances.setdefault(label, []).append(confidence)
+
+        best = max(self.scores, key=self.scores.get)
+        distances = self.distances[best]
+        self.label = best
+        self.confidence = sum(distances) / len(distances) if best is not None else max(distances)
+
+
+class FaceTracker:
+    """简单的多目标人脸跟踪器（贪心IoU匹配）"""
+
+    def __init__(self, match_threshold, iou_threshold=0.3, max_center_distance=0.5, max_missed=10,
+                 min_predictions=3, reverify_interval=15):
+        """
+        match_threshold: LBPH距离低于此值才认为是已知员工
+        iou_threshold: IoU大于此值视为同一人脸
+        max_center_distance: IoU不足时，中心点距离（相对框尺寸）小于此值也视为同一人脸
+        max_missed: 连续多少帧未出现后删除轨迹
+        min_predictions: 轨迹建立后连续识别的次数
+        reverify_interval: 身份确认后每隔多少帧复核一次
+        """
+        self.match_threshold = match_threshold
+        self.iou_threshold = iou_threshold
+        self.max_center_distance = max_center_distance
+        self.max_missed = max_missed
+        self.min_predictions = min_predictions
+        self.reverify_interval = reverify_interval
+
+        self.tracks = []
+        self.next_id = 1
+
+    def reset(self):
+        """清除所有轨迹"""
+        self.tracks = []
+
+    def needs_verification(self, track):
+        """判断轨迹本帧是否需要运行识别"""
+        if track.predictions < self.min_predictions:
+            return True
+        return track.frames_since_verify >= self.reverify_interval
+
+    def is_confirmed(self, track):
+        """轨迹的身份是否已经过足够次数的识别"""
+        return track.predictions >= self.min_predictions
+
+    def add_prediction(self, track, label, confidence):
+        """为轨迹加入一次识别结果"""
+        track.add_prediction(label, confidence, self.match_threshold)
+
+    def update(self, boxes):
+        """用本帧检测框更新轨迹，返回与boxes一一对应的轨迹"""
+        pairs = []
+        for t, track in enumerate(self.tracks):
+            for b, box in enumerate(boxes):
+                iou = box_iou(track.box, box)
+                if iou >= self.iou_threshold:
+                    pairs.append((iou, t, b))
+                elif center_distance(track.box, box) <= self.max_center_distance:
+                    # 快速移动时IoU可能很小，用中心点距离兜底（排在IoU匹配之后）
+                    pairs.append((iou - 1.0, t, b))
+        pairs.sort(reverse=True)
+
+        assigned = [None] * len(boxes)
+        used_tracks = set()
+        for _, t, b in pairs:
+            if t in used_tracks or assigned[b] is not None:
+                continue
+            used_tracks.add(t)
+            assigned[b] = self.tracks[t]
+
+        for b, box in enumerate(boxes):
+            track = assigned[b]
+            if track is None:
+                track = FaceTrack(self.next_id, box)
+                self.next_id += 1
+                self.tracks.append(track)
+                assigned[b] = track
+            else:
+                track.box = box
+                track.missed = 0
+            track.age += 1
+            track.frames_since_verify += 1
+
+        matched = set(id(track) for track in assigned)
+        for track in self.tracks:
+            if id(track) not in matched:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        return assigned
+
+
+def create_face_tracker(match_threshold):
+    """根据config.py创建人脸跟踪器，未启用时返回None"""
+    if not get_setting("TRACKER_ENABLED", True):
+        return None
+    return FaceTracker(
+        match_threshold,
+        min_predictions=get_setting("TRACK_MIN_PREDICTIONS", 3),
+        reverify_interval=get_setting("TRACK_REVERIFY_INTERVAL", 15),
+    )
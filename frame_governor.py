@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+自适应帧率调节
+没有调节时处理线程以摄像头帧率满负荷运行，无人时也一样，无风扇的考勤终端会过热。
+FrameRateGovernor 在读取每一帧之前按目标帧率等待（wait），取到画面后开始计时（begin）：
+- 有人时按 ACTIVE_FPS 处理，同时保证处理时间不超过单核CPU的 CPU_BUDGET 比例；
+- 连续 IDLE_AFTER 秒没有检测到人脸后降到 IDLE_FPS（空闲模式）；
+- 空闲模式下一旦检测到人脸，立即恢复正常帧率（不等待下一个空闲间隔）。
+界面刷新画面的间隔也随实际处理帧率调整。
+
+需要配合摄像头采集线程（frame_grabber.py）使用：等待期间采集线程继续读取画面，
+醒来后处理的总是最新的一帧。
+"""
+
+import time
+
+from app_config import get_setting
+
+# 界面刷新间隔的范围（毫秒）
+MIN_DISPLAY_INTERVAL = 15
+MAX_DISPLAY_INTERVAL = 500
+# 单次等待的最长时间（秒），保证停止摄像头时能及时退出；没等到处理时间时 wait() 返回False
+MAX_WAIT = 1.0
+
+
+class FrameRateGovernor:
+    """按有无人脸在正常帧率和空闲帧率之间切换，并限制处理线程的CPU占用"""
+
+    def __init__(self, active_fps=15, idle_fps=2, idle_after=10, cpu_budget=0.6, log=None,
+                 clock=time.monotonic, sleep=time.sleep):
+        """
+        active_fps: 有人时的最高处理帧率
+        idle_fps: 空闲模式的处理帧率
+        idle_after: 连续多少秒没有检测到人脸后进入空闲模式
+        cpu_budget: 处理线程最多占用单核CPU的比例（0~1），None表示不限制
+        log: 可选的日志回调，报告模式切换
+        """
+        self.active_fps = active_fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.cpu_budget = cpu_budget
+        self.log = log
+        self.clock = clock
+        self.sleep = sleep
+
+        self.idle = False
+        self.last_face = clock()
+        self.next_frame = 0.0
+        self.frame_start = None
+        # 处理耗时和帧间隔的指数移动平均（秒）
+        self.processing_avg = None
+        self.interval_avg = None
+
+        # 统计计数
+        self.frames = 0
+        self.idle_frames = 0
+        self.switches = 0
+        self.waited = 0.0
+        self.started = clock()
+
+    def target_interval(self):
+        """当前模式下两帧之间的目标间隔（秒）"""
+        interval = 1.0 / (self.idle_fps if self.idle else self.active_fps)
+        if self.cpu_budget and self.processing_avg is not None:
+            interval = max(interval, self.processing_avg / self.cpu_budget)
+        return interval
+
+    def wait(self):
+        """
+        读取下一帧之前调用，等待到下一帧的处理时间
+        单次最多等待MAX_WAIT秒，返回False表示还没到处理时间（如IDLE_FPS小于1），
+        调用方应检查是否已停止，然后再次调用 wait()，不读取画面
+        """
+        delay = self.next_frame - self.clock()
+        if delay > 0:
+            self.sleep(min(delay, MAX_WAIT))
+            self.waited += min(delay, MAX_WAIT)
+        return delay <= MAX_WAIT
+
+    def begin(self):
+        """取到画面后、处理之前调用；等待摄像头出帧的时间不计入处理耗时"""
+        now = self.clock()
+        if self.frame_start is not None:
+            elapsed = now - self.frame_start
+            self.interval_avg = elapsed if self.interval_avg is None else 0.8 * self.interval_avg + 0.2 * elapsed
+        self.frame_start = now
+
+    def update(self, face_count):
+        """一帧处理完成后调用，face_count为本帧检测到的人脸数"""
+        now = self.clock()
+        start = self.frame_start if self.frame_start is not None else now
+        processing = now - start
+        self.processing_avg = processing if self.processing_avg is None else \
+            0.8 * self.processing_avg + 0.2 * processing
+        self.frames += 1
+        if self.idle:
+            self.idle_frames += 1
+
+        if face_count > 0:
+            self.last_face = now
+            if self.idle:
+                # 有人出现：立即处理下一帧
+                self._switch(False)
+                self.next_frame = now
+                return
+        elif not self.idle and now - self.last_face >= self.idle_after:
+            self._switch(True)
+        self.next_frame = start + self.target_interval()
+
+    def _switch(self, idle):
+        self.idle = idle
+        self.switches += 1
+        if self.log is not None:
+            if idle:
+                self.log(f"{self.idle_after}秒内未检测到人脸，进入空闲模式（{self.idle_fps} 帧/秒）")
+            else:
+                self.log(f"检测到人脸，恢复正常帧率（{self.active_fps} 帧/秒）")
+
+    def display_interval(self):
+        """界面刷新画面的间隔（毫秒），与实际处理帧率一致"""
+        # 从空闲模式恢复时不等平均值下降，立即按当前目标帧率刷新
+        interval = self.target_interval()
+        if self.interval_avg is not None:
+            interval = min(interval, self.interval_avg)
+        return int(min(MAX_DISPLAY_INTERVAL, max(MIN_DISPLAY_INTERVAL, interval * 1000)))
+
+    def stats(self):
+        """返回调节统计"""
+        elapsed = self.clock() - self.started
+        return {
+            "frames": self.frames,
+            "fps": self.frames / elapsed if elapsed > 0 else 0.0,
+            "idle_ratio": self.idle_frames / self.frames if self.frames else 0.0,
+            "switches": self.switches,
+            "wait_ratio": self.waited / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (f"平均 {stats['fps']:.1f} 帧/秒，空闲模式 {stats['idle_ratio']:.0%} 的帧，"
+                f"模式切换 {stats['switches']} 次，等待 {stats['wait_ratio']:.0%} 的时间")
+
+
+def create_frame_governor(log=None):
+    """根据config.py创建帧率调节器，FRAME_GOVERNOR_ENABLED为False时返回None"""
+    if not get_setting("FRAME_GOVERNOR_ENABLED", True):
+        return None
+    return FrameRateGovernor(
+        active_fps=get_setting("ACTIVE_FPS", 15),
+        idle_fps=get_setting("IDLE_FPS", 2),
+        idle_after=get_setting("IDLE_AFTER", 10),
+        cpu_budget=get_setting("CPU_BUDGET", 0.6),
+        log=log,
+    )
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+摄像头采集线程
+cap.read() 与检测、识别在同一线程时，处理慢于摄像头帧率会让驱动缓冲区积压，
+显示和识别的都是几秒前的画面。FrameGrabber 在独立线程中持续读取画面，
+放入只保留最近几帧的环形缓冲区；处理线程每次取最新的一帧，来不及处理的旧帧直接丢弃并计数，
+从人走到摄像头前到打卡的延迟不超过一帧的处理时间。
+
+视频文件需要逐帧处理，不使用采集线程（见 is_live_source）。
+"""
+
+import collections
+import datetime
+import threading
+import time
+from dataclasses import dataclass
+
+from app_config import get_setting
+
+
+@dataclass
+class CapturedFrame:
+    """采集到的一帧"""
+    frame: object
+    index: int              # 采集序号（从1开始）
+    timestamp: datetime.datetime
+    captured_at: float      # time.perf_counter()
+
+    @property
+    def age(self):
+        """采集后经过的时间（秒）"""
+        return time.perf_counter() - self.captured_at
+
+
+def is_live_source(source):
+    """设备索引和网络视频流（rtsp://、http://等）是实时来源，本地视频文件不是"""
+    return isinstance(source, int) or "://" in str(source)
+
+
+class FrameGrabber:
+    """在后台线程读取摄像头画面，处理线程总是取最新的一帧"""
+
+    # 读帧失败后重试前等待的时间（秒）
+    RETRY_DELAY = 0.01
+
+    def __init__(self, cap, buffer_size=2):
+        """
+        cap: 已打开的 cv2.VideoCapture，由调用方在 stop() 之后释放
+        buffer_size: 环形缓冲区保留的帧数
+        """
+        self.cap = cap
+        self.buffer = collections.deque(maxlen=buffer_size)
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # 统计计数
+        self.captured = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_index = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.processed = 0
+
+    def start(self):
+        """启动采集线程"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2):
+        """停止采集线程（之后才能释放摄像头）"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+
+    def _capture_loop(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            if not ret:
+                # 实时摄像头偶尔读帧失败，稍后重试
+                self.failures += 1
+                time.sleep(self.RETRY_DELAY)
+                continue
+            with self.condition:
+                self.captured += 1
+                self.buffer.append(CapturedFrame(frame, self.captured, datetime.datetime.now(), time.perf_counter()))
+                self.condition.notify()
+
+    def read(self, timeout=1.0):
+        """取最新的一帧（CapturedFrame），旧帧丢弃；超时或已停止时返回None"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.buffer or not self.running, timeout):
+                return None
+            if not self.buffer:
+                return None
+            captured = self.buffer.pop()
+            self.buffer.clear()
+            # 上次取帧之后采集、但没有被处理的帧
+            self.dropped += captured.index - self.last_index - 1
+            self.last_index = captured.index
+            self.delivered += 1
+            return captured
+
+    def mark_processed(self, captured):
+        """一帧处理完成（识别和打卡判定之后调用），记录从采集到处理完成的延迟"""
+        latency = captured.age
+        self.processed += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def stats(self):
+        """返回采集统计"""
+        return {
+            "captured": self.captured,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "drop_ratio": self.dropped / self.captured if self.captured else 0.0,
+            "latency_avg": self.latency_total / self.processed if self.processed else 0.0,
+            "latency_max": self.latency_max,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (f"采集 {stats['captured']} 帧，处理 {stats['delivered']} 帧，"
+                f"丢弃旧帧 {stats['dropped']} 帧 ({stats['drop_ratio']:.0%})，"
+                f"延迟 平均 {stats['latency_avg'] * 1000:.0f}ms / 最大 {stats['latency_max'] * 1000:.0f}ms")
+
+
+def create_frame_grabber(cap, source=0):
+    """根据config.py为实时来源创建采集线程（未启动），CAPTURE_THREAD为False或来源是视频文件时返回None"""
+    if not get_setting("CAPTURE_THREAD", True) or not is_live_source(source):
+        return None
+    import cv2
+
+    # 尽量减少驱动缓冲区中积压的旧帧（部分后端不支持，设置失败时忽略）
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return FrameGrabber(cap, get_setting("FRAME_BUFFER_SIZE", 2))
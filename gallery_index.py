@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+训练样本索引（IVF倒排索引）
+LBPH识别要与每一个训练样本比较，耗时与样本数成正比；员工上万人时逐一比较太慢。
+GalleryIndex 先把样本直方图降维，再用k-means聚类成若干个簇，识别时只精确比较
+离人脸最近的 probes 个簇中的样本，耗时约为 样本数 x probes / 簇数。
+
+降维前先对直方图开平方：开平方后的欧氏距离平方即Hellinger距离 H，
+而卡方距离（HISTCMP_CHISQR_ALT）满足 2H <= 卡方距离 <= 4H，两者排序基本一致，
+适合用来挑选候选样本；候选样本的卡方距离仍精确计算。
+probes 越大召回率越高、越慢，probes 等于簇数时与逐一比较的结果完全相同。
+
+对比测试（合成人脸数据，或已训练的模型文件）：
+    python gallery_index.py --identities 5000 --samples 4 --probes 1,4,8,16
+    python gallery_index.py --model face_model.yml
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+# 用于计算主成分的最多样本数
+PCA_SAMPLES = 4096
+# k-means每个簇使用的训练点数（总数超过样本数时用全部样本）
+KMEANS_POINTS_PER_LIST = 64
+KMEANS_ITERATIONS = 12
+# 分块计算到簇中心的距离时每块的行数
+CHUNK_ROWS = 4096
+# 降维时每块的行数（输入可能是半精度，逐块转换为float32）
+PROJECT_CHUNK_ROWS = 512
+
+
+def fit_pca(rows, dims, rng, power_iterations=2):
+    """随机化PCA，返回 (均值, 主成分矩阵 (dims, D))"""
+    mean = rows.mean(axis=0)
+    centered = rows - mean
+    dims = min(dims, len(rows), rows.shape[1])
+    sketch = centered @ rng.standard_normal((rows.shape[1], dims + 10)).astype(np.float32)
+    for _ in range(power_iterations):
+        sketch, _ = np.linalg.qr(sketch)
+        sketch = centered @ (centered.T @ sketch)
+    basis, _ = np.linalg.qr(sketch)
+    _, _, vt = np.linalg.svd(basis.T @ centered, full_matrices=False)
+    return mean, np.ascontiguousarray(vt[:dims], dtype=np.float32)
+
+
+def nearest_centroids(points, centroids, count=1):
+    """每个点最近的count个簇中心下标，返回 (N, count)，按距离从近到远排列"""
+    count = min(count, len(centroids))
+    centroid_norms = (centroids * centroids).sum(axis=1)
+    result = np.empty((len(points), count), dtype=np.int64)
+    for start in range(0, len(points), CHUNK_ROWS):
+        chunk = points[start:start + CHUNK_ROWS]
+        # 到各簇中心的距离平方（省略每个点自身的范数，不影响排序）
+        distances = centroid_norms[None, :] - 2.0 * (chunk @ centroids.T)
+        if count < len(centroids):
+            nearest = np.argpartition(distances, count - 1, axis=1)[:, :count]
+        else:
+            nearest = np.broadcast_to(np.arange(count), (len(chunk), count))
+        order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1)
+        result[start:start + CHUNK_ROWS] = np.take_along_axis(nearest, order, axis=1)
+    return result
+
+
+def kmeans(points, count, rng, iterations=KMEANS_ITERATIONS):
+    """k-means聚类，返回簇中心 (count, d)"""
+    centroids = points[rng.choice(len(points), count, replace=False)].copy()
+    for _ in range(iterations):
+        assign = nearest_centroids(points, centroids)[:, 0]
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, points)
+        sizes = np.bincount(assign, minlength=count)
+        empty = sizes == 0
+        centroids[~empty] = sums[~empty] / sizes[~empty, None]
+        # 空簇重新随机选点
+        if empty.any():
+            centroids[empty] = points[rng.choice(len(points), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class GalleryIndex:
+    """
+    训练样本直方图的IVF索引
+    输入为开平方后的直方图（行向量），search() 返回候选样本的下标，由调用方精确计算距离
+    """
+
+    def __init__(self, vectors, dims=64, lists=None, probes=8, seed=0):
+        """
+        vectors: 开平方后的训练样本直方图 (N, D)，float32或float16
+        dims: 降维后的维数
+        lists: 簇数，None时取 4 * sqrt(N)
+        probes: 识别时搜索的簇数（召回率与速度的取舍，可随时修改）
+        """
+        rng = np.random.default_rng(seed)
+        count = len(vectors)
+        if count == 0:
+            raise ValueError("没有训练样本，无法建立索引")
+        sample = vectors[np.sort(rng.choice(count, min(count, PCA_SAMPLES), replace=False))].astype(np.float32)
+        self.mean, self.components = fit_pca(sample, dims, rng)
+        projected = self.project(vectors)
+
+        lists = lists or int(4 * math.sqrt(count))
+        lists = max(1, min(lists, count))
+        points = projected[rng.choice(count, min(count, lists * KMEANS_POINTS_PER_LIST), replace=False)]
+        self.centroids = kmeans(points, lists, rng)
+        self.probes = probes
+        self.assign = nearest_centroids(projected, self.centroids)[:, 0]
+        self._build_lists()
+
+    def _build_lists(self):
+        """按所属的簇整理样本下标（倒排表）"""
+        self.order = np.argsort(self.assign, kind="stable")
+        sizes = np.bincount(self.assign, minlength=len(self.centroids))
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)])
+
+    def __len__(self):
+        return len(self.assign)
+
+    @property
+    def lists(self):
+        return len(self.centroids)
+
+    def project(self, vectors):
+        """降维，返回 (N, dims)"""
+        offset = self.mean @ self.components.T
+        result = np.empty((len(vectors), len(self.components)), dtype=np.float32)
+        for start in range(0, len(vectors), PROJECT_CHUNK_ROWS):
+            block = vectors[start:start + PROJECT_CHUNK_ROWS].astype(np.float32, copy=False)
+            result[start:start + PROJECT_CHUNK_ROWS] = block @ self.components.T - offset
+        return result
+
+    def add(self, vectors):
+        """追加样本（增量录入），下标接在已有样本之后；不重新聚类"""
+        if len(vectors) == 0:
+            return
+        self.assign = np.concatenate([self.assign, nearest_centroids(self.project(vectors), self.centroids)[:, 0]])
+        self._build_lists()
+
+    def search(self, vectors, probes=None):
+        """每个查询的候选样本下标，返回 [ndarray, ...]"""
+        probes = self.probes if probes is None else probes
+        if probes >= self.lists:
+            return [np.arange(len(self))] * len(vectors)
+        nearest = nearest_centroids(self.project(vectors), self.centroids, probes)
+        return [np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in row]) for row in nearest]
+
+    def summary(self):
+        sizes = np.diff(self.offsets)
+        return (f"{len(self)} 个样本，{self.lists} 个簇（平均 {sizes.mean():.0f}，最大 {sizes.max()}），"
+                f"降维 {self.components.shape[1]} -> {len(self.components)}，probes={self.probes}")
+
+
+def synthetic_faces(identities, samples, queries, seed=0):
+    """生成合成人脸（每人一张随机纹理加光照、噪声和轻微旋转），返回 (训练图像生成器, 标签, 查询图像, 查询标签)"""
+    import cv2
+    from recognition_pipeline import FACE_SIZE
+
+    width, height = FACE_SIZE
+
+    def identity(i):
+        rng = np.random.default_rng(i)
+        low = cv2.GaussianBlur(rng.normal(0, 1, (height, width)).astype(np.float32), (0, 0), 12)
+        mid = cv2.GaussianBlur(rng.normal(0, 1, (height, width)).astype(np.float32), (0, 0), 3)
+        return 128 + 60 * low / low.std() + 25 * mid / mid.std()
+
+    def variant(base, rng):
+        img = base * rng.uniform(0.9, 1.1) + rng.normal(0, 4, base.shape)
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rng.uniform(-3, 3), 1.0)
+        matrix[:, 2] += rng.uniform(-2, 2, 2)
+        img = cv2.warpAffine(img.astype(np.float32), matrix, (width, height), borderMode=cv2.BORDER_REFLECT)
+        return np.clip(img, 0, 255).astype(np.uint8)
+
+    rng = np.random.default_rng(seed)
+    query_labels = rng.integers(0, identities, queries)
+    query_faces = [variant(identity(int(i)), rng) for i in query_labels]
+
+    def training_faces():
+        for i in range(identities):
+            base = identity(i)
+            for _ in range(samples):
+                yield variant(base, rng)
+
+    labels = np.repeat(np.arange(identities), samples)
+    return training_faces(), labels, query_faces, query_labels
+
+
+def benchmark(matcher, queries, probes_list, repeat=1):
+    """
+    比较逐一精确比较（结果与 predict() 相同）和各 probes 设置的索引：
+    每张人脸的平均耗时、与精确结果标签相同的比例（召回率）、精确计算的样本比例
+    """
+    index = matcher.index
+
+    def run(probes=None):
+        if index is not None and probes is not None:
+            index.probes = probes
+        matcher.exact_pairs = matcher.total_pairs = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            results = [matcher.match(query) for query in queries]
+        elapsed = (time.perf_counter() - start) / (repeat * len(queries))
+        return results, elapsed
+
+    # 暂时去掉索引，作为精确结果
+    matcher.index = None
+    try:
+        reference, baseline = run()
+    finally:
+        matcher.index = index
+    print(f"逐一比较: {baseline * 1000:8.2f} ms/人脸  精确计算 {matcher.stats()['exact_ratio']:.2%} 的样本")
+    for probes in probes_list:
+        results, elapsed = run(probes)
+        same = sum(a[0] == b[0] for a, b in zip(results, reference)) / len(reference)
+        nearest = sum(abs(a[1] - b[1]) < 1e-6 for a, b in zip(results, reference)) / len(reference)
+        print(f"probes={probes:<4} {elapsed * 1000:8.2f} ms/人脸  加速 {baseline / elapsed:5.1f}x  "
+              f"标签召回率 {same:.1%}  最近样本一致 {nearest:.1%}  "
+              f"精确计算 {matcher.stats()['exact_ratio']:.2%} 的样本")
+    return reference
+
+
+def main():
+    """对比测试：索引与逐一比较的召回率和耗时"""
+    from lbph_matcher import LBPHMatcher, read_gallery
+
+    parser = argparse.ArgumentParser(description="训练样本索引与逐一比较的召回率和耗时对比")
+    parser.add_argument("--model", help="使用已训练的模型文件（从中取出部分样本作为查询），默认生成合成人脸")
+    parser.add_argument("--identities", type=int, default=2000, help="合成数据的人数")
+    parser.add_argument("--samples", type=int, default=5, help="合成数据每人的训练样本数")
+    parser.add_argument("--queries", type=int, default=100, help="查询人脸数")
+    parser.add_argument("--probes", default="1,2,4,8,16,32", help="逗号分隔的probes取值")
+    parser.add_argument("--dims", type=int, default=64, help="降维后的维数")
+    parser.add_argument("--lists", type=int, default=None, help="簇数，默认 4 * sqrt(样本数)")
+    parser.add_argument("--opencv", action="store_true", help="同时测试 predict()（合成数据，需训练OpenCV模型，较慢）")
+    args = parser.parse_args()
+
+    import cv2
+
+    recognizer = None
+    query_faces = None
+    if args.model:
+        model = cv2.face.LBPHFaceRecognizer_create()
+        model.read(args.model)
+        gallery, labels = read_gallery(model)
+        del model
+        # 取出部分样本作为查询，其余作为训练样本
+        rng = np.random.default_rng(0)
+        picked = rng.choice(len(labels), min(args.queries, len(labels) - 1), replace=False)
+        rest = np.setdiff1d(np.arange(len(labels)), picked)
+        queries = gallery[picked]
+        gallery, labels = gallery[rest], labels[rest]
+    else:
+        print(f"生成合成人脸: {args.identities} 人 x {args.samples} 个样本 ...")
+        faces, labels, query_faces, _ = synthetic_faces(args.identities, args.samples, args.queries)
+        describer = LBPHMatcher(np.zeros((0, 0), np.float32), [])
+        training = [] if args.opencv else None
+        chunks, batch = [], []
+        for face in faces:
+            batch.append(face)
+            if training is not None:
+                training.append(face)
+            if len(batch) == 256:
+                chunks.append(describer.describe(batch))
+                batch = []
+        if batch:
+            chunks.append(describer.describe(batch))
+        gallery = np.vstack(chunks)
+        del chunks
+        queries = describer.describe(query_faces)
+        if args.opencv:
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.train(training, labels)
+            del training
+
+    start = time.perf_counter()
+    matcher = LBPHMatcher(gallery, labels)
+    del gallery
+    matcher.build_index(args.dims, args.lists)
+    print(f"建立索引 {time.perf_counter() - start:.1f}s: {matcher.index.summary()}")
+
+    probes_list = [int(p) for p in args.probes.split(",") if p.strip()]
+    reference = benchmark(matcher, queries, probes_list)
+
+    if recognizer is not None:
+        start = time.perf_counter()
+        results = [recognizer.predict(face) for face in query_faces]
+        elapsed = (time.perf_counter() - start) / len(query_faces)
+        same = all(a[0] == b[0] and abs(a[1] - b[1]) < 1e-4 for a, b in zip(results, reference))
+        print(f"predict(): {elapsed * 1000:8.2f} ms/人脸  与逐一比较结果{'一致' if same else '不一致'}")
+
+
+if __name__ == "__main__":
+    main()
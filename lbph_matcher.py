@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+LBPH批量匹配
+cv2.face.LBPHFaceRecognizer.predict() 每次只能识别一张人脸，人多时（如交接班时的门口）
+一帧要调用多次。LBPHMatcher 用NumPy一次提取一帧中所有人脸的LBP直方图，
+再把它们与全部训练样本的直方图作为矩阵一次计算卡方距离（HISTCMP_CHISQR_ALT），
+结果（标签、距离）与 predict() 一致，可直接使用现有的置信度阈值（50/65/75/80）。
+
+直方图提取与OpenCV的实现逐位对应：圆形ELBP（双线性插值）+ 分块归一化直方图，
+训练样本的直方图直接从模型读取（getHistograms），无需重新训练。
+训练样本很多时（GALLERY_INDEX_MIN_SAMPLES）建立IVF索引（gallery_index.py），只精确比较候选样本。
+"""
+
+import math
+
+import numpy as np
+
+from app_config import get_setting
+from gallery_index import GalleryIndex
+
+# 分块计算距离时每块最多的元素数（临时数组约4MB，尽量留在CPU缓存中）
+CHUNK_ELEMENTS = 1024 * 1024
+# 半精度开平方直方图转换为float32时每块的行数（临时数组约16MB）
+SQRT_CHUNK_ROWS = 256
+# float16的单位舍入误差（相对误差上界）
+FLOAT16_EPSILON = 2.0 ** -11
+
+
+def elbp(faces, radius=1, neighbors=8):
+    """
+    批量计算圆形扩展LBP，faces为 (K, H, W) uint8数组
+    返回 (K, H-2r, W-2r) 的int32编码（与OpenCV lbph_faces.cpp 中的 elbp 一致）
+    """
+    src = faces.astype(np.float32)
+    count, rows, cols = src.shape
+    center = src[:, radius:rows - radius, radius:cols - radius]
+    codes = np.zeros(center.shape, dtype=np.int32)
+    epsilon = np.finfo(np.float32).eps
+
+    for n in range(neighbors):
+        # 采样点坐标
+        x = np.float32(radius * math.cos(2.0 * math.pi * n / neighbors))
+        y = np.float32(-radius * math.sin(2.0 * math.pi * n / neighbors))
+        fx, fy = int(math.floor(x)), int(math.floor(y))
+        cx, cy = int(math.ceil(x)), int(math.ceil(y))
+        # 小数部分与双线性插值权重
+        ty, tx = y - np.float32(fy), x - np.float32(fx)
+        w1 = (np.float32(1) - tx) * (np.float32(1) - ty)
+        w2 = tx * (np.float32(1) - ty)
+        w3 = (np.float32(1) - tx) * ty
+        w4 = tx * ty
+
+        def shifted(dy, dx):
+            return src[:, radius + dy:rows - radius + dy, radius + dx:cols - radius + dx]
+
+        t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        codes += ((t > center) | (np.abs(t - center) < epsilon)).astype(np.int32) << n
+    return codes
+
+
+def spatial_histograms(codes, num_patterns, grid_x=8, grid_y=8):
+    """
+    批量计算分块直方图，codes为elbp的结果
+    每块的直方图按像素数归一化，返回 (K, grid_x * grid_y * num_patterns) float32
+    """
+    count, rows, cols = codes.shape
+    width, height = cols // grid_x, rows // grid_y
+    cells = codes[:, :grid_y * height, :grid_x * width]
+    # (K, grid_y, height, grid_x, width) -> (K, grid_y, grid_x, height * width)
+    cells = cells.reshape(count, grid_y, height, grid_x, width).transpose(0, 1, 3, 2, 4)
+    cells = cells.reshape(count, grid_y * grid_x, height * width)
+
+    # 每个块的编码加上块偏移后一次bincount
+    offsets = np.arange(count * grid_y * grid_x, dtype=np.int64).reshape(count, grid_y * grid_x, 1) * num_patterns
+    hist = np.bincount((cells + offsets).ravel(), minlength=count * grid_y * grid_x * num_patterns)
+    hist = hist.reshape(count, grid_y * grid_x * num_patterns).astype(np.float32)
+    return hist / np.float32(height * width)
+
+
+def chi_square_distances(queries, gallery, chunk_elements=CHUNK_ELEMENTS):
+    """
+    卡方距离矩阵（与cv2.compareHist的HISTCMP_CHISQR_ALT一致）：sum 2 * (a - b)^2 / (a + b)
+    queries: (K, D)，gallery: (M, D)，返回 (K, M) float64
+
+    所有查询直方图都为0的维度上，每项恰好等于 2 * b，合计为 2 * (样本总和 - 其余维度之和)，
+    因此只需在查询直方图非0的维度上逐项计算（LBP直方图大部分维度为0）。
+    """
+    count = len(queries)
+    columns = np.flatnonzero(queries.any(axis=0))
+    a = queries[:, None, columns]                          # (K, 1, d)
+    sub = gallery[:, columns]                              # (M, d)
+    distances = 2.0 * (gallery.sum(axis=1, dtype=np.float64) - sub.sum(axis=1, dtype=np.float64))
+    distances = np.repeat(distances[None, :], count, axis=0)
+
+    # 分块计算，控制临时数组大小
+    step = max(1, chunk_elements // max(1, count * len(columns)))
+    tiny = np.float32(1e-30)   # 直方图最小的非0值为1/块像素数，远大于该值；a + b 为0时该项为0
+    for start in range(0, len(sub), step):
+        b = sub[None, start:start + step]                  # (1, m, d)
+        diff = a - b
+        np.multiply(diff, diff, out=diff)
+        diff /= (a + b + tiny)
+        distances[:, start:start + step] += 2.0 * diff.sum(axis=2, dtype=np.float64)
+    return distances
+
+
+class LBPHMatcher:
+    """
+    LBPH模型的批量匹配器，从已训练的 cv2.face.LBPHFaceRecognizer 读取参数和训练样本直方图
+
+    逐项计算卡方距离的代价与 样本数 x 维度 成正比。先用一次矩阵乘法（BLAS）算出所有人脸到所有样本的
+    Hellinger距离 H = sum (sqrt(a) - sqrt(b))^2，由于每一项满足
+        (a - b)^2 / (a + b) = (sqrt(a) - sqrt(b))^2 * (sqrt(a) + sqrt(b))^2 / (a + b)，后一个因子在[1, 2]之间，
+    卡方距离一定不小于 2H。只有下界小于当前最优距离的样本才需要计算精确的卡方距离，
+    结果与逐个比较完全相同。
+
+    开平方的直方图是训练样本的第二份副本。建立索引后每张人脸只比较少量候选样本，
+    该副本默认改为半精度（float16）存储以减少内存，下界中扣除半精度舍入误差的上界，结果仍然精确。
+    """
+
+    # 每张人脸先精确计算下界最小的若干个样本，得到当前最优距离
+    INITIAL_CANDIDATES = 8
+
+    def __init__(self, histograms, labels, radius=1, neighbors=8, grid_x=8, grid_y=8, threshold=float("inf"),
+                 sqrt_dtype=np.float32):
+        histograms = np.asarray(histograms, dtype=np.float32)
+        self.gallery = np.ascontiguousarray(histograms.reshape(len(labels), -1 if len(labels) else 0))
+        self.gallery_sqrt = self._roots(self.gallery, sqrt_dtype)
+        self.gallery_sums = self.gallery.sum(axis=1, dtype=np.float64)
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+        # 训练样本索引（None表示与全部样本比较）
+        self.index = None
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.threshold = threshold
+        # 统计：精确计算卡方距离的样本比例
+        self.exact_pairs = 0
+        self.total_pairs = 0
+
+    @staticmethod
+    def _roots(histograms, dtype):
+        """逐块开平方并转换为指定精度，避免产生完整的float32临时副本"""
+        roots = np.empty(histograms.shape, dtype=dtype)
+        for start in range(0, len(histograms), SQRT_CHUNK_ROWS):
+            roots[start:start + SQRT_CHUNK_ROWS] = np.sqrt(histograms[start:start + SQRT_CHUNK_ROWS])
+        return roots
+
+    @classmethod
+    def from_recognizer(cls, recognizer, sqrt_dtype=np.float32):
+        """从已训练的LBPH模型创建（模型重新训练后需重新创建，增量录入后可用extend追加）"""
+        gallery, labels = read_gallery(recognizer)
+        return cls(gallery, labels, recognizer.getRadius(), recognizer.getNeighbors(),
+                   recognizer.getGridX(), recognizer.getGridY(), recognizer.getThreshold(), sqrt_dtype)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def build_index(self, dims=64, lists=None, probes=8, half_precision=True):
+        """
+        为训练样本建立IVF索引（样本数万时需要几秒）
+        half_precision: 开平方的副本随后改为半精度存储（内存减半，计算下界时需要转换，约慢3倍）
+        """
+        self.index = GalleryIndex(self.gallery_sqrt, dims, lists, probes)
+        if half_precision and self.gallery_sqrt.dtype != np.float16:
+            self.gallery_sqrt = self._roots(self.gallery, np.float16)
+        return self.index
+
+    def extend(self, histograms, labels):
+        """追加训练样本（增量录入），已有索引时新样本直接加入索引"""
+        labels = np.asarray(labels, dtype=np.int32).ravel()
+        if len(labels) == 0:
+            return
+        histograms = np.asarray(histograms, dtype=np.float32).reshape(len(labels), -1)
+        roots = np.sqrt(histograms)
+        if len(self.labels) == 0:
+            self.gallery = np.ascontiguousarray(histograms)
+            self.gallery_sqrt = roots.astype(self.gallery_sqrt.dtype)
+        else:
+            self.gallery = np.vstack([self.gallery, histograms])
+            self.gallery_sqrt = np.vstack([self.gallery_sqrt, roots.astype(self.gallery_sqrt.dtype)])
+        self.gallery_sums = np.concatenate([self.gallery_sums, histograms.sum(axis=1, dtype=np.float64)])
+        self.labels = np.concatenate([self.labels, labels])
+        if self.index is not None:
+            self.index.add(roots)
+
+    def describe(self, faces):
+        """提取一组人脸（相同尺寸的灰度图）的LBP直方图，返回 (K, D)"""
+        codes = elbp(np.stack(faces), self.radius, self.neighbors)
+        return spatial_histograms(codes, 2 ** self.neighbors, self.grid_x, self.grid_y)
+
+    def lower_bounds(self, queries, rows=None):
+        """人脸到样本（rows为None时为全部样本）的卡方距离下界 2H，返回 (K, len(rows))"""
+        gallery_sums = self.gallery_sums if rows is None else self.gallery_sums[rows]
+        query_sums = queries.sum(axis=1, dtype=np.float64)
+        roots = np.sqrt(queries)
+        if self.gallery_sqrt.dtype == np.float32:
+            gallery_sqrt = self.gallery_sqrt if rows is None else self.gallery_sqrt[rows]
+            overlap = roots @ gallery_sqrt.T                      # sum sqrt(a * b)
+            margin = 0.0
+        else:
+            # 半精度存储：逐块转换为float32计算，只取人脸直方图非零的维度（其余维度 sqrt(a) = 0）
+            columns = np.flatnonzero(queries.any(axis=0))
+            roots = roots[:, columns]
+            count = len(self.labels) if rows is None else len(rows)
+            overlap = np.empty((len(queries), count), dtype=np.float32)
+            for start in range(0, count, SQRT_CHUNK_ROWS):
+                block = self.gallery_sqrt[start:start + SQRT_CHUNK_ROWS] if rows is None \
+                    else self.gallery_sqrt[rows[start:start + SQRT_CHUNK_ROWS]]
+                overlap[:, start:start + SQRT_CHUNK_ROWS] = roots @ block[:, columns].astype(np.float32).T
+            # 每个sqrt(b)的相对误差不超过FLOAT16_EPSILON，由Cauchy-Schwarz不等式，
+            # sum sqrt(a * b) 的误差不超过 FLOAT16_EPSILON * sqrt(sum a * sum b)，H的误差不超过其2倍
+            margin = 2.0 * FLOAT16_EPSILON * np.sqrt(query_sums[:, None] * gallery_sums[None, :])
+        hellinger = query_sums[:, None] + gallery_sums[None, :] - 2.0 * overlap
+        # 留出float32矩阵乘法的舍入余量
+        return 2.0 * np.maximum(hellinger - margin, 0.0) * (1 - 1e-4) - 1e-6
+
+    def nearest(self, query, bounds, rows=None):
+        """在样本（rows为None时为全部样本）中精确查找一张人脸最近的样本，返回 (样本下标, 卡方距离)"""
+        order = np.argsort(bounds)
+        candidates = order if rows is None else rows[order]
+        bounds = bounds[order]
+        first = candidates[:self.INITIAL_CANDIDATES]
+        distances = chi_square_distances(query[None], self.gallery[first])[0]
+        best = int(distances.argmin())
+        index, distance = int(first[best]), float(distances[best])
+        exact = len(first)
+
+        rest = candidates[self.INITIAL_CANDIDATES:][bounds[self.INITIAL_CANDIDATES:] < distance]
+        if len(rest):
+            distances = chi_square_distances(query[None], self.gallery[rest])[0]
+            best = int(distances.argmin())
+            if distances[best] < distance:
+                index, distance = int(rest[best]), float(distances[best])
+            exact += len(rest)
+
+        self.exact_pairs += exact
+        self.total_pairs += len(self.labels)
+        return index, distance
+
+    def match(self, query, bounds=None):
+        """
+        识别一个LBP直方图，返回 (标签, 距离)，与 predict() 的返回值一致
+        bounds: 到全部样本的距离下界（批量计算好的），有索引时忽略
+        """
+        rows = None
+        if self.index is not None:
+            rows = self.index.search(np.sqrt(query[None]))[0]
+            bounds = self.lower_bounds(query[None], rows)[0]
+        elif bounds is None:
+            bounds = self.lower_bounds(query[None])[0]
+        index, distance = self.nearest(query, bounds, rows)
+        if distance < self.threshold:
+            return int(self.labels[index]), distance
+        # 与OpenCV一致：没有低于阈值的样本时返回 -1
+        return -1, float(np.finfo(np.float64).max)
+
+    def predict_batch(self, faces):
+        """一次识别多张人脸，返回 [(标签, 距离), ...]，与 predict() 的返回值一致"""
+        if not faces:
+            return []
+        if len(self.labels) == 0:
+            raise ValueError("模型中没有训练样本")
+        queries = self.describe(faces)
+        if self.index is not None:
+            return [self.match(query) for query in queries]
+        bounds = self.lower_bounds(queries)
+        return [self.match(query, query_bounds) for query, query_bounds in zip(queries, bounds)]
+
+    def stats(self):
+        """返回精确计算的样本比例"""
+        return {
+            "exact_pairs": self.exact_pairs,
+            "total_pairs": self.total_pairs,
+            "exact_ratio": self.exact_pairs / self.total_pairs if self.total_pairs else 0.0,
+        }
+
+
+def read_gallery(recognizer):
+    """读取LBPH模型中全部训练样本的直方图和标签，返回 (直方图 (M, D), 标签 (M,))"""
+    histograms = recognizer.getHistograms()
+    labels = np.asarray(recognizer.getLabels()).ravel()
+    gallery = np.vstack([np.asarray(h, dtype=np.float32).reshape(1, -1) for h in histograms]) \
+        if len(histograms) else np.zeros((0, 0), dtype=np.float32)
+    return gallery, labels
+
+
+def create_matcher(recognizer, previous=None, log=None):
+    """
+    根据config.py为LBPH模型创建批量匹配器，训练样本数达到GALLERY_INDEX_MIN_SAMPLES时建立索引
+    previous: 同一模型之前的匹配器，模型只是增量录入了新样本时在其基础上追加
+    """
+    min_samples = get_setting("GALLERY_INDEX_MIN_SAMPLES", 20000)
+    half_precision = get_setting("GALLERY_SQRT_FLOAT16", True)
+    count = len(recognizer.getLabels())
+    # 需要建立索引时直接以半精度保存开平方的副本
+    indexed = min_samples is not None and count >= min_samples
+    sqrt_dtype = np.float16 if half_precision and indexed else np.float32
+    if previous is not None and 0 < len(previous) < count:
+        gallery, labels = read_gallery(recognizer)
+        if np.array_equal(labels[:len(previous)], previous.labels):
+            previous.extend(gallery[len(previous):], labels[len(previous):])
+            matcher = previous
+        else:
+            matcher = None
+    else:
+        matcher = None
+    if matcher is None:
+        matcher = LBPHMatcher.from_recognizer(recognizer, sqrt_dtype)
+
+    if matcher.index is None and min_samples is not None and len(matcher) >= min_samples:
+        matcher.build_index(
+            dims=get_setting("GALLERY_INDEX_DIMS", 64),
+            lists=get_setting("GALLERY_INDEX_LISTS", None),
+            probes=get_setting("GALLERY_INDEX_PROBES", 8),
+            half_precision=half_precision,
+        )
+        if log is not None:
+            log(f"训练样本索引: {matcher.index.summary()}")
+    return matcher
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+智能问答结果缓存
+缓存键为"规范化后的问题 + 考勤数据版本"，同一个问题在数据没有变化时直接返回上次的回答；
+有新的打卡记录写入、日期变化或员工名单变化后数据版本随之改变，旧回答自动失效。
+缓存按TTL过期、按LRU淘汰，并保存到 llm_cache.json，重启后仍然有效。
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from app_config import get_setting
+
+LLM_CACHE_FILE = "llm_cache.json"
+
+# 问题末尾可忽略的标点
+_TRAILING_PUNCTUATION = "?？!！。.,，~～ "
+
+
+def normalize_query(query):
+    """规范化问题文本：统一全角/半角、大小写，合并空白，去掉末尾标点"""
+    text = unicodedata.normalize("NFKC", query).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+
+def attendance_data_version(store, employee_names=None, today=None):
+    """考勤数据版本：日期 + 存储版本 + 员工名单摘要（提示词中包含这三部分）"""
+    today = today or datetime.date.today()
+    roster = json.dumps(sorted((employee_names or {}).items()), ensure_ascii=False)
+    roster_digest = hashlib.sha1(roster.encode("utf-8")).hexdigest()[:12]
+    return f"{today.isoformat()}|{store.data_version()}|{roster_digest}"
+
+
+class ResponseCache:
+    """LLM回答缓存（线程安全）"""
+
+    def __init__(self, path=LLM_CACHE_FILE, maxsize=200, ttl=24 * 3600):
+        """
+        path: 持久化文件，None表示只缓存在内存中
+        maxsize: 最多缓存的回答条数
+        ttl: 回答的有效期（秒）
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @staticmethod
+    def make_key(query, data_version, model=""):
+        """缓存键：规范化问题 + 数据版本 + 模型名"""
+        raw = "\n".join([normalize_query(query), data_version, model])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        """读取持久化的缓存，丢弃已过期的条目"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return  # 缓存文件损坏时从空缓存开始
+        now = time.time()
+        for key, entry in saved:
+            if now - entry["created"] < self.ttl:
+                self.entries[key] = entry
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def _save(self):
+        """保存缓存（调用方持有锁）"""
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self.entries.items()), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, query, data_version, model=""):
+        """返回缓存的回答，未命中或已过期返回None"""
+        key = self.make_key(query, data_version, model)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry["created"] >= self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry["response"]
+
+    def put(self, query, data_version, response, model=""):
+        """缓存回答"""
+        key = self.make_key(query, data_version, model)
+        with self.lock:
+            self.entries[key] = {"query": query, "response": response, "created": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            try:
+                self._save()
+            except OSError:
+                pass  # 持久化失败不影响本次回答
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.entries.clear()
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
+
+
+def create_response_cache():
+    """根据config.py创建问答缓存，LLM_CACHE_ENABLED为False时返回None"""
+    if not get_setting("LLM_CACHE_ENABLED", True):
+        return None
+    return ResponseCache(
+        path=get_setting("LLM_CACHE_FILE", LLM_CACHE_FILE),
+        maxsize=get_setting("LLM_CACHE_SIZE", 200),
+        ttl=get_setting("LLM_CACHE_TTL", 24 * 3600),
+    )
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+LLM API客户端（OpenAI兼容接口）
+- 使用持久的 requests.Session，连接保持复用，不必每次提问都重新建立TCP/TLS连接
+- 连接失败和 429/5xx 响应按指数退避自动重试
+- 支持 stream: true 的SSE流式输出，边生成边显示，缩短首字等待时间
+"""
+
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app_config import get_setting
+
+
+class LLMClient:
+    """OpenAI兼容的对话补全客户端"""
+
+    def __init__(self, api_url, api_key, model, timeout=30, max_retries=3, backoff=0.5,
+                 temperature=0.7, max_tokens=2000):
+        """
+        timeout: 连接超时与两次读取之间的最长等待（秒），流式输出时不限制总时长
+        max_retries: 连接失败或 429/5xx 时的最大重试次数
+        backoff: 重试退避基数（秒），第n次重试前等待 backoff * 2^(n-1)
+        """
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(max_retries=retry))
+        self.session.mount("http://", HTTPAdapter(max_retries=retry))
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        })
+
+    def _post(self, prompt, stream):
+        data = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
+        if stream:
+            data["stream"] = True
+        response = self.session.post(self.api_url, json=data, timeout=self.timeout, stream=stream)
+        response.raise_for_status()
+        return response
+
+    def complete(self, prompt):
+        """等待完整回答后返回"""
+        result = self._post(prompt, stream=False).json()
+        return result['choices'][0]['message']['content']
+
+    def stream(self, prompt):
+        """流式输出，逐段返回生成的文字"""
+        with self._post(prompt, stream=True) as response:
+            # SSE按UTF-8编码，服务端未声明时requests会按ISO-8859-1解码导致中文乱码
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue  # 空行和注释行（如心跳）
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                for choice in chunk.get("choices", []):
+                    content = choice.get("delta", {}).get("content")
+                    if content:
+                        yield content
+
+    def close(self):
+        self.session.close()
+
+
+def create_llm_client(api_url, api_key, model):
+    """根据config.py创建LLM客户端"""
+    return LLMClient(
+        api_url, api_key, model,
+        timeout=get_setting("LLM_TIMEOUT", 30),
+        max_retries=get_setting("LLM_MAX_RETRIES", 3),
+        backoff=get_setting("LLM_RETRY_BACKOFF", 0.5),
+    )
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+运动检测门控
+用低分辨率帧差（背景累积平均）判断画面是否有运动，
+画面静止时跳过人脸检测 detectMultiScale，降低空闲时的CPU占用。
+可以只在指定区域（如门口）内判断运动。
+"""
+
+import cv2
+import numpy as np
+
+from app_config import get_setting
+
+
+class MotionGate:
+    """帧差法运动门控，只有检测到运动时才运行人脸检测"""
+
+    def __init__(self, threshold=25, min_area=0.002, zone=None, scale=0.25,
+                 learning_rate=0.05, hold_frames=15):
+        """
+        threshold: 像素灰度变化超过该值才算运动（越小越灵敏）
+        min_area: 运动像素占检测区域的最小比例（越小越灵敏）
+        zone: 检测区域，矩形 (x, y, w, h) 或多边形 [(x, y), ...]，None为整个画面
+        scale: 运动检测时的缩放比例
+        learning_rate: 背景更新速度
+        hold_frames: 检测到运动或人脸后，继续检测的帧数
+        """
+        self.threshold = threshold
+        self.min_area = min_area
+        self.zone = zone
+        self.scale = scale
+        self.learning_rate = learning_rate
+        self.hold_frames = hold_frames
+
+        self.background = None
+        self.mask = None
+        self.zone_pixels = 0
+        self.hold = 0
+
+        # 统计计数
+        self.frames = 0
+        self.motion_frames = 0
+        self.skipped = 0
+
+    def reset(self):
+        """清除背景（切换视频或跳转位置后调用）"""
+        self.background = None
+        self.hold = 0
+
+    def _prepare(self, gray):
+        """缩小并模糊，抑制噪声"""
+        small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def _build_mask(self, shape):
+        """根据检测区域生成掩码"""
+        height, width = shape
+        if self.zone is None:
+            self.mask = None
+            self.zone_pixels = height * width
+            return
+
+        if isinstance(self.zone[0], (list, tuple)):
+            points = np.array(self.zone, dtype=np.float32)
+        else:
+            x, y, w, h = self.zone
+            points = np.array([(x, y), (x + w, y), (x + w, y + h), (x, y + h)], dtype=np.float32)
+
+        self.mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.fillPoly(self.mask, [np.round(points * self.scale).astype(np.int32)], 255)
+        self.zone_pixels = max(1, cv2.countNonZero(self.mask))
+
+    def has_motion(self, gray):
+        """判断当前帧相对背景是否有运动"""
+        small = self._prepare(gray)
+        if self.background is None or self.background.shape != small.shape:
+            self.background = small.astype(np.float32)
+            self._build_mask(small.shape)
+            return True
+
+        diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(small, self.background, self.learning_rate)
+
+        _, motion = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+        if self.mask is not None:
+            motion = cv2.bitwise_and(motion, self.mask)
+        return cv2.countNonZero(motion) >= self.min_area * self.zone_pixels
+
+    def check(self, gray):
+        """返回True表示本帧需要运行人脸检测"""
+        self.frames += 1
+        if self.has_motion(gray):
+            self.motion_frames += 1
+            self.hold = self.hold_frames
+            return True
+        if self.hold > 0:
+            self.hold -= 1
+            return True
+        self.skipped += 1
+        return False
+
+    def notify_faces(self, count):
+        """检测到人脸时保持检测，避免静止站立的人被跳过"""
+        if count > 0:
+            self.hold = self.hold_frames
+
+    def stats(self):
+        """返回统计信息"""
+        return {
+            "frames": self.frames,
+            "motion": self.motion_frames,
+            "skipped": self.skipped,
+            "skip_ratio": self.skipped / self.frames if self.frames else 0.0,
+        }
+
+
+def create_motion_gate():
+    """根据config.py创建运动门控，未启用时返回None"""
+    if not get_setting("MOTION_GATE_ENABLED", True):
+        return None
+    return MotionGate(
+        threshold=get_setting("MOTION_THRESHOLD", 25),
+        min_area=get_setting("MOTION_MIN_AREA", 0.002),
+        zone=get_setting("MOTION_ZONE", None),
+        hold_frames=get_setting("MOTION_HOLD_FRAMES", 15),
+    )
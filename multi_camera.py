@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+多摄像头考勤
+每个摄像头由独立的工作进程处理（不受GIL限制，吞吐量随核数线性增长），
+所有进程共用同一个已加载的LBPH模型，打卡事件汇总到主进程统一写入，
+冷却期跨摄像头生效（同一员工在任一入口打卡后，5分钟内其他入口不再重复记录）。
+
+摄像头来源可以是设备索引或视频文件/RTSP地址，在config.py中配置 CAMERA_SOURCES，
+或通过命令行指定：
+    python multi_camera.py --source 0 --source rtsp://192.168.1.10/stream
+    python multi_camera.py --source door_a.mp4 --source door_b.mp4
+"""
+
+import argparse
+import datetime
+import multiprocessing
+import queue
+import sys
+import time
+
+import cv2
+
+from app_config import get_setting
+from attendance_store import (
+    COOLDOWN_SECONDS, CooldownTracker, attendance_row, create_attendance_store, create_attendance_writer,
+)
+from frame_governor import create_frame_governor
+from frame_grabber import create_frame_grabber
+from recognition_pipeline import load_pipeline
+
+# 主进程中加载的模型；fork方式启动时子进程直接共享（写时复制），无需重复加载
+_shared_pipeline = None
+
+# 工作进程统计信息的上报间隔（帧）
+STATS_INTERVAL = 300
+
+
+def parse_source(source):
+    """解析摄像头来源：纯数字视为设备索引，否则视为文件或URL"""
+    if isinstance(source, int):
+        return source
+    source = str(source).strip()
+    return int(source) if source.isdigit() else source
+
+
+def camera_worker(camera_id, source, event_queue, stop_event):
+    """摄像头工作进程：读取画面、识别人脸并上报打卡事件"""
+    # 每个进程只用一个OpenCV线程，由进程数来利用多核
+    cv2.setNumThreads(1)
+
+    if _shared_pipeline is not None:
+        pipeline = _shared_pipeline.clone()
+    else:
+        pipeline = load_pipeline()
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        event_queue.put(("error", camera_id, f"无法打开摄像头: {source}"))
+        event_queue.put(("done", camera_id))
+        return
+
+    # 实时来源在独立线程中采集，识别跟不上时丢弃旧帧；视频文件逐帧处理
+    grabber = create_frame_grabber(cap, source)
+    governor = None
+    if grabber is not None:
+        grabber.start()
+        # 无人时降低处理帧率
+        governor = create_frame_governor()
+
+    frames = 0
+    begin = time.perf_counter()
+    try:
+        while not stop_event.is_set():
+            if grabber is not None:
+                if governor is not None and not governor.wait():
+                    continue
+                captured = grabber.read(timeout=0.5)
+                if captured is None:
+                    continue
+                if governor is not None:
+                    governor.begin()
+                result = pipeline.process(captured.frame, captured.timestamp)
+                grabber.mark_processed(captured)
+                if governor is not None:
+                    governor.update(len(result.detections))
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    # 视频文件读完即结束；实时摄像头偶尔读帧失败则继续
+                    if isinstance(source, str):
+                        break
+                    continue
+                result = pipeline.process(frame)
+            for event in result.events:
+                event_queue.put(("checkin", camera_id, event))
+
+            frames += 1
+            if frames % STATS_INTERVAL == 0:
+                event_queue.put(("stats", camera_id, frames, time.perf_counter() - begin))
+    finally:
+        if grabber is not None:
+            grabber.stop()
+            event_queue.put(("log", camera_id, f"采集: {grabber.summary()}"))
+        if governor is not None:
+            event_queue.put(("log", camera_id, f"帧率调节: {governor.summary()}"))
+        cap.release()
+        event_queue.put(("stats", camera_id, frames, time.perf_counter() - begin))
+        event_queue.put(("done", camera_id))
+
+
+class MultiCameraRunner:
+    """启动多个摄像头工作进程，汇总打卡事件并统一写入考勤"""
+
+    def __init__(self, sources, cooldown_seconds=COOLDOWN_SECONDS, on_checkin=None):
+        self.sources = [parse_source(s) for s in sources]
+        self.cooldown = CooldownTracker(cooldown_seconds)
+        self.on_checkin = on_checkin
+        self.attendance_store = create_attendance_store()
+        self.cooldown.load(self.attendance_store.last_checkins())
+        self.attendance_writer = create_attendance_writer(self.attendance_store)
+        self.event_queue = multiprocessing.Queue()
+        self.stop_event = multiprocessing.Event()
+        self.workers = []
+        self.camera_stats = {}
+
+    def start(self):
+        """加载模型并为每个摄像头启动一个工作进程"""
+        global _shared_pipeline
+        # 在fork之前创建批量匹配器和训练样本索引，各工作进程写时复制共享
+        _shared_pipeline = load_pipeline(log=print)
+
+        for camera_id, source in enumerate(self.sources):
+            worker = multiprocessing.Process(
+                target=camera_worker,
+                args=(camera_id, source, self.event_queue, self.stop_event),
+                daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self):
+        """通知所有工作进程停止"""
+        self.stop_event.set()
+
+    def run(self, duration=None):
+        """在主进程中汇总事件，直到所有摄像头结束或达到运行时长"""
+        deadline = time.monotonic() + duration if duration else None
+        running = len(self.workers)
+        while running > 0:
+            if deadline and time.monotonic() >= deadline:
+                self.stop()
+                deadline = None
+            try:
+                message = self.event_queue.get(timeout=0.5)
+            except queue.Empty:
+                if not any(w.is_alive() for w in self.workers):
+                    break
+                continue
+
+            kind, camera_id = message[0], message[1]
+            if kind == "checkin":
+                self.handle_checkin(camera_id, message[2])
+            elif kind == "stats":
+                self.camera_stats[camera_id] = (message[2], message[3])
+            elif kind == "error":
+                print(f"❌ 摄像头{camera_id}: {message[2]}")
+            elif kind == "log":
+                print(f"摄像头{camera_id}: {message[2]}")
+            elif kind == "done":
+                running -= 1
+
+        for worker in self.workers:
+            worker.join(timeout=2)
+
+    def close(self):
+        """写完剩余的考勤记录并关闭存储"""
+        self.attendance_writer.close()
+        self.attendance_store.close()
+
+    def handle_checkin(self, camera_id, event):
+        """跨摄像头冷却期过滤后写入考勤"""
+        if self.cooldown.in_cooldown(event.emp_id, event.timestamp):
+            return False
+        if not self.attendance_writer.submit(attendance_row(event.emp_id, event.name, event.timestamp)):
+            return False
+        self.cooldown.mark(event.emp_id, event.timestamp)
+        if self.on_checkin:
+            self.on_checkin(camera_id, event)
+        return True
+
+    def report(self):
+        """打印每个摄像头的处理帧率"""
+        total_fps = 0.0
+        for camera_id, source in enumerate(self.sources):
+            frames, elapsed = self.camera_stats.get(camera_id, (0, 0.0))
+            fps = frames / elapsed if elapsed > 0 else 0.0
+            total_fps += fps
+            print(f"摄像头{camera_id} ({source}): {frames} 帧, {fps:.1f} FPS")
+        print(f"合计: {total_fps:.1f} FPS")
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="多摄像头考勤（每个摄像头一个进程）")
+    parser.add_argument("--source", action="append", help="摄像头来源（设备索引、视频文件或URL），可多次指定")
+    parser.add_argument("--duration", type=float, default=None, help="运行时长（秒），默认一直运行")
+    parser.add_argument("--cooldown", type=float, default=COOLDOWN_SECONDS, help="打卡冷却期（秒）")
+    args = parser.parse_args(argv)
+
+    sources = args.source or get_setting("CAMERA_SOURCES", [0])
+
+    def print_checkin(camera_id, event):
+        print(f"[{datetime.datetime.now():%Y-%m-%d %H:%M:%S}] ✓ {event.name} 打卡成功 - 摄像头{camera_id}")
+
+    runner = MultiCameraRunner(sources, cooldown_seconds=args.cooldown, on_checkin=print_checkin)
+    try:
+        try:
+            runner.start()
+        except FileNotFoundError as e:
+            print(f"❌ {e}，请先在主程序中训练模型")
+            return 1
+
+        print(f"已启动 {len(runner.workers)} 个摄像头进程，按 Ctrl+C 停止")
+        try:
+            runner.run(duration=args.duration)
+        except KeyboardInterrupt:
+            runner.stop()
+            runner.run()
+        runner.report()
+    finally:
+        # 写完剩余的考勤记录，关闭写入线程和存储
+        runner.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+画面标注
+先收集一帧中所有的检测框和文字标签，再一次性绘制。
+文字只在标签所在的小区域内用PIL绘制，不再对整帧做 BGR→RGB→PIL→BGR 转换。
+画面上的文字大多重复（人数、姓名、置信度），可以用 TextBitmapCache 缓存渲染好的
+文字位图和透明度掩码，之后直接在NumPy帧上做alpha混合。
+"""
+
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+def text_size(text, font):
+    """返回文字的 (宽, 高)"""
+    if hasattr(font, "getbbox"):
+        left, top, right, bottom = font.getbbox(text)
+        return right, bottom
+    return font.getsize(text)
+
+
+class TextBitmap:
+    """渲染好的文字位图：透明度和预乘颜色"""
+
+    def __init__(self, alpha, color):
+        self.alpha = alpha.reshape(alpha.shape[0], alpha.shape[1], 1)
+        self.inv_alpha = 1.0 - self.alpha
+        self.premultiplied = self.alpha * np.array(color, dtype=np.float32)
+
+
+class TextBitmapCache:
+    """文字位图LRU缓存，键为 (文字, 字体, 颜色)"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text, font, color):
+        """获取文字位图，未缓存时渲染"""
+        key = (text, font, tuple(color))
+        bitmap = self.entries.get(key)
+        if bitmap is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return bitmap
+
+        self.misses += 1
+        bitmap = self.render(text, font, color)
+        self.entries[key] = bitmap
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return bitmap
+
+    @staticmethod
+    def render(text, font, color):
+        """把文字渲染为透明度掩码"""
+        w, h = text_size(text, font)
+        mask = Image.new("L", (max(w, 1), max(h, 1)), 0)
+        ImageDraw.Draw(mask).text((0, 0), text, font=font, fill=255)
+        alpha = np.asarray(mask, dtype=np.float32) / 255.0
+        return TextBitmap(alpha, color)
+
+    def draw(self, frame, text, position, font, color):
+        """把文字alpha混合到帧上（原地修改）"""
+        bitmap = self.get(text, font, color)
+        frame_h, frame_w = frame.shape[:2]
+        bitmap_h, bitmap_w = bitmap.alpha.shape[:2]
+        x, y = int(position[0]), int(position[1])
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + bitmap_w, frame_w), min(y + bitmap_h, frame_h)
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        bx0, by0 = x0 - x, y0 - y
+        bx1, by1 = bx0 + (x1 - x0), by0 + (y1 - y0)
+        region = frame[y0:y1, x0:x1]
+        blended = region * bitmap.inv_alpha[by0:by1, bx0:bx1] + bitmap.premultiplied[by0:by1, bx0:bx1]
+        region[:] = blended.astype(np.uint8)
+
+    def stats(self):
+        """返回缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+class FrameOverlay:
+    """一帧的标注集合，颜色统一使用OpenCV的BGR顺序"""
+
+    def __init__(self, text_cache=None):
+        self.boxes = []
+        self.labels = []
+        # 文字位图缓存（None表示每次都重新渲染）
+        self.text_cache = text_cache
+
+    def add_box(self, box, color, thickness=2):
+        """添加检测框 (x, y, w, h)"""
+        self.boxes.append((box, color, thickness))
+
+    def add_text(self, text, position, font, color):
+        """添加文字标签，position为左上角坐标"""
+        self.labels.append((text, position, font, color))
+
+    def render(self, frame):
+        """把所有标注绘制到帧上（原地修改）并返回该帧"""
+        for (x, y, w, h), color, thickness in self.boxes:
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, thickness)
+        for text, position, font, color in self.labels:
+            if self.text_cache is not None:
+                self.text_cache.draw(frame, text, position, font, color)
+            else:
+                self._draw_text(frame, text, position, font, color)
+        return frame
+
+    def _draw_text(self, frame, text, position, font, color):
+        """只在文字所在区域内绘制"""
+        frame_h, frame_w = frame.shape[:2]
+        x, y = int(position[0]), int(position[1])
+        w, h = text_size(text, font)
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, frame_w), min(y + h, frame_h)
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        # 直接在BGR数据上绘制，颜色也按BGR给出，无需颜色空间转换
+        region = Image.fromarray(frame[y0:y1, x0:x1])
+        ImageDraw.Draw(region).text((x - x0, y - y0), text, font=font, fill=tuple(color))
+        frame[y0:y1, x0:x1] = np.asarray(region)
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+智能问答提示词构建
+使用增量维护的汇总表（每日出勤人数、员工每日首次/最后打卡、员工月度汇总）
+代替完整的考勤明细，提示词大小只与时间窗口和员工数有关，与历史记录总量无关。
+
+问题中提到员工（姓名或员工ID）或日期（今天、上周、8月1日等）时，只提供相关的数据切片：
+该日期范围的出勤人数、相关员工的每日汇总和打卡明细。
+各部分按重要程度依次放入，超出token预算时截断或省略靠后的部分，并在提示词中注明。
+"""
+
+import datetime
+import re
+import sys
+from dataclasses import dataclass, field
+
+from app_config import get_setting
+from query_engine import find_employees, parse_date_range
+
+# 各汇总表的时间窗口
+HEADCOUNT_DAYS = get_setting("PROMPT_HEADCOUNT_DAYS", 31)   # 每日出勤人数
+DAILY_DAYS = get_setting("PROMPT_DAILY_DAYS", 7)            # 员工每日首次/最后打卡
+MONTHS = get_setting("PROMPT_MONTHS", 3)                    # 员工月度汇总
+
+# 每张表最多放入的行数
+MAX_TABLE_ROWS = get_setting("PROMPT_MAX_TABLE_ROWS", 300)
+
+# 考勤数据部分的token预算（不含固定的说明文字和问题）
+TOKEN_BUDGET = get_setting("PROMPT_TOKEN_BUDGET", 4000)
+
+# 问题涉及员工时，未指定日期则提供最近多少天的数据
+EMPLOYEE_DAYS = get_setting("PROMPT_EMPLOYEE_DAYS", 31)
+
+# 为截断/省略说明预留的token数
+NOTE_TOKENS = 40
+
+_CJK = re.compile(r"[\u3000-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text):
+    """粗略估计token数：中文字符约1个token，其他字符约4个一个token"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def month_start(day, months_back):
+    """返回day所在月往前推months_back个月的月份（YYYY-MM）"""
+    year, month = day.year, day.month - months_back
+    while month <= 0:
+        month += 12
+        year -= 1
+    return f"{year:04d}-{month:02d}"
+
+
+def format_roster(employee_names, max_rows=MAX_TABLE_ROWS):
+    """格式化员工名单"""
+    if not employee_names:
+        return "暂无数据"
+    items = [f"{emp_id} {name}" for emp_id, name in sorted(employee_names.items())]
+    text = "、".join(items[:max_rows])
+    if len(items) > max_rows:
+        text += f"\n（共 {len(items)} 人，仅显示前 {max_rows} 人）"
+    return text
+
+
+def fit_table(df, budget, keep="tail"):
+    """格式化表格，按最大行数和token预算截断，返回 (文本, 显示的行数)；一行都放不下时文本为空"""
+    if df is None or df.empty:
+        return "暂无数据", 0
+
+    def render(rows):
+        shown = df.tail(rows) if keep == "tail" else df.head(rows)
+        return shown.to_string(index=False)
+
+    rows = min(len(df), MAX_TABLE_ROWS)
+    text = render(rows)
+    tokens = estimate_tokens(text)
+    while tokens > budget:
+        # 按平均每行的token数估算能放下的行数，再逐步逼近
+        rows = min(rows - 1, int(rows * budget / tokens))
+        if rows <= 0:
+            return "", 0
+        text = render(rows)
+        tokens = estimate_tokens(text)
+    return text, rows
+
+
+@dataclass
+class ContextSection:
+    """提示词中的一部分考勤数据"""
+    title: str
+    data: object          # DataFrame 或 文本
+    keep: str = "tail"    # 截断时保留最近的行（tail）或最前面的行（head）
+
+
+@dataclass
+class PromptReport:
+    """提示词构建结果：各部分的取舍情况"""
+    tokens: int = 0
+    budget: int = 0
+    sections: list = field(default_factory=list)    # 完整放入的部分
+    truncated: list = field(default_factory=list)   # (标题, 显示行数, 总行数)
+    omitted: list = field(default_factory=list)     # 因预算不足省略的部分
+
+    def summary(self):
+        parts = [f"约 {self.tokens} tokens（预算 {self.budget}）"]
+        if self.truncated:
+            parts.append("截断: " + "、".join(f"{title} {shown}/{total}行" for title, shown, total in self.truncated))
+        if self.omitted:
+            parts.append("省略: " + "、".join(self.omitted))
+        return "，".join(parts)
+
+
+def select_context(store, query, employee_names=None, today=None):
+    """根据问题选择相关的考勤数据，返回按重要程度排列的 [ContextSection, ...]"""
+    employee_names = employee_names or {}
+    today = today or datetime.date.today()
+    text = re.sub(r"\s+", "", query)
+    try:
+        date_range = parse_date_range(text, today)
+    except ValueError:
+        date_range = None
+    employees = find_employees(text, employee_names)
+
+    sections = []
+    if employees:
+        start, end, label = date_range or (today - datetime.timedelta(days=EMPLOYEE_DAYS - 1), today,
+                                           f"最近{EMPLOYEE_DAYS}天")
+        period = f"{label}，{start.isoformat()} 至 {end.isoformat()}"
+        for emp_id, name in employees:
+            sections.append(ContextSection(
+                f"{name}({emp_id}) 每日首次/最后打卡（{period}）",
+                store.daily_summary(start.isoformat(), end.isoformat(), emp_id)))
+        sections.append(ContextSection(
+            f"每日出勤人数（{period}）", store.daily_headcount(start.isoformat(), end.isoformat())))
+        for emp_id, name in employees:
+            sections.append(ContextSection(
+                f"{name}({emp_id}) 打卡明细（{period}）",
+                store.query(start.isoformat(), end.isoformat(), emp_id)[["日期", "时间"]]))
+        for emp_id, name in employees:
+            sections.append(ContextSection(
+                f"{name}({emp_id}) 月度出勤汇总（最近{MONTHS}个月）",
+                store.monthly_totals(month_start(today, MONTHS - 1), today.strftime("%Y-%m"), emp_id)))
+        sections.append(ContextSection("员工名单", format_roster(employee_names)))
+        return sections
+
+    if date_range:
+        start, end, label = date_range
+        period = f"{label}，{start.isoformat()} 至 {end.isoformat()}"
+        sections.append(ContextSection(
+            f"每日出勤人数（{period}）", store.daily_headcount(start.isoformat(), end.isoformat())))
+        sections.append(ContextSection("员工名单", format_roster(employee_names)))
+        sections.append(ContextSection(
+            f"员工每日首次/最后打卡（{period}）", store.daily_summary(start.isoformat(), end.isoformat())))
+        sections.append(ContextSection(
+            f"员工月度出勤汇总（{start.strftime('%Y-%m')} 至 {end.strftime('%Y-%m')}）",
+            store.monthly_totals(start.strftime("%Y-%m"), end.strftime("%Y-%m"))))
+        return sections
+
+    # 没有具体的员工或日期：提供最近一段时间的概况
+    sections.append(ContextSection(
+        f"每日出勤人数（最近{HEADCOUNT_DAYS}天）",
+        store.daily_headcount((today - datetime.timedelta(days=HEADCOUNT_DAYS - 1)).isoformat(), today.isoformat())))
+    sections.append(ContextSection("员工名单", format_roster(employee_names)))
+    sections.append(ContextSection(
+        f"员工每日首次/最后打卡（最近{DAILY_DAYS}天）",
+        store.daily_summary((today - datetime.timedelta(days=DAILY_DAYS - 1)).isoformat(), today.isoformat())))
+    sections.append(ContextSection(
+        f"员工月度出勤汇总（最近{MONTHS}个月）",
+        store.monthly_totals(month_start(today, MONTHS - 1), today.strftime("%Y-%m"))))
+    return sections
+
+
+def render_sections(sections, budget=TOKEN_BUDGET):
+    """在token预算内依次放入各部分，返回 (文本, PromptReport)"""
+    report = PromptReport(budget=budget)
+    blocks = []
+    remaining = budget - NOTE_TOKENS
+    for section in sections:
+        header = f"{section.title}："
+        available = remaining - estimate_tokens(header) - 2
+        if isinstance(section.data, str):
+            body, shown, total = section.data, None, None
+            if estimate_tokens(body) > available:
+                body = ""
+        else:
+            body, shown = fit_table(section.data, available, section.keep)
+            total = len(section.data)
+        if not body:
+            report.omitted.append(section.title)
+            continue
+        if total and shown < total:
+            body += f"\n（共 {total} 行，因长度限制仅显示{'最近' if section.keep == 'tail' else '前'} {shown} 行）"
+            report.truncated.append((section.title, shown, total))
+        else:
+            report.sections.append(section.title)
+        block = f"{header}\n{body}"
+        blocks.append(block)
+        remaining -= estimate_tokens(block) + 1
+
+    if report.omitted:
+        blocks.append("（因长度限制省略：" + "、".join(report.omitted) + "）")
+    text = "\n\n".join(blocks) if blocks else "暂无数据"
+    report.tokens = estimate_tokens(text)
+    return text, report
+
+
+def build_analysis_prompt(store, query, employee_names=None, today=None, token_budget=TOKEN_BUDGET, log=None):
+    """
+    根据问题选择相关的汇总数据构建LLM提示词
+    log: 可选的日志回调，报告提示词大小和截断情况
+    """
+    today = today or datetime.date.today()
+    sections = select_context(store, query, employee_names, today)
+    context, report = render_sections(sections, token_budget)
+    if log is not None:
+        log(f"提示词: {report.summary()}")
+
+    return f"""你是一个专业的考勤数据分析助手。请根据以下考勤数据回答用户的问题。
+
+今天是 {today.isoformat()}（星期{"一二三四五六日"[today.weekday()]}）。
+
+{context}
+
+用户问题：{query}
+
+请提供简洁、准确的分析回答。"""
+
+
+def self_check():
+    """检查问题是否选中了正确的数据范围（python prompt_builder.py），返回失败的问题数"""
+    from attendance_store import SqliteAttendanceStore, attendance_row
+
+    store = SqliteAttendanceStore(":memory:")
+    names = {"1": "李四", "2": "王五", "3": "张三"}
+    store.append([attendance_row("1", "李四", datetime.datetime(2026, 3, 5, 8, 30))])
+    today = datetime.date(2026, 3, 6)
+
+    # (问题, 应只提供数据的员工；空表示全体员工)
+    cases = [
+        # 日期中的数字不是员工ID（张三的ID是3），全公司的问题不能只提供一个人的数据
+        ("3月5日考勤情况分析", []),
+        ("分析一下3/5的出勤", []),
+        ("最近7天的出勤趋势", []),
+        ("张三3月5日为什么没来", ["张三(3)"]),
+        ("分析工号3的考勤", ["张三(3)"]),
+    ]
+    failures = 0
+    try:
+        for query, expected in cases:
+            sections = select_context(store, query, names, today)
+            narrowed = sorted({section.title.split(" ")[0] for section in sections
+                               if section.title.split(" ")[0].endswith(")")})
+            ok = narrowed == expected
+            if not ok:
+                failures += 1
+            print(f"{'✓' if ok else '✗'} {query} -> {'、'.join(narrowed) or '全体员工'}")
+    finally:
+        store.close()
+    print(f"共 {len(cases)} 个问题，失败 {failures} 个")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if self_check() else 0)
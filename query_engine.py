@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+本地考勤问答
+识别常见的结构化问题，直接查询考勤汇总表作答（毫秒级，不需要联网）：
+- 出勤人数：  "今天有多少人签到？"、"昨天出勤人数"
+- 未打卡名单："今天谁没打卡"、"3月5日缺勤的人"
+- 个人记录：  "张三本周的打卡记录"、"李四上个月来了几天"
+- 最早/最晚： "今天谁来得最早"、"昨天最晚到的是谁"
+无法识别的开放式问题返回None，由LLM回答。
+"""
+
+import datetime
+import re
+import sys
+
+from app_config import get_setting
+
+# 含这些词的问题需要分析推理，交给LLM
+OPEN_ENDED_KEYWORDS = ("为什么", "原因", "分析", "建议", "趋势", "评价", "怎么办", "如何", "预测", "对比", "比较")
+
+HEADCOUNT_KEYWORDS = ("多少人", "几个人", "几人", "人数")
+ABSENT_KEYWORDS = ("谁没", "没打卡", "没签到", "没来", "未打卡", "未签到", "缺勤", "没到")
+EARLIEST_KEYWORDS = ("最早",)
+LATEST_KEYWORDS = ("最晚", "最迟")
+RECORD_KEYWORDS = ("打卡", "签到", "考勤", "记录", "出勤", "来了", "几天", "几点")
+
+WEEKDAYS = "一二三四五六日"
+
+_FULL_DATE = re.compile(r"(\d{4})[-/年](\d{1,2})[-/月](\d{1,2})[日号]?")
+_MONTH_DAY = re.compile(r"(\d{1,2})月(\d{1,2})[日号]")
+_SLASH_DATE = re.compile(r"(?<![\d/])(\d{1,2})/(\d{1,2})(?![\d/])")
+_RECENT_DAYS = re.compile(r"(?:最近|近)(\d{1,3})天")
+
+# 带标记的员工ID：工号3、员工ID 3、编号3、3号员工
+_MARKED_ID = re.compile(r"(?:工号|员工ID|员工编号|编号|ID|id)[:：\s]*(\d+)|(\d+)号员工")
+# 日期、时间和数量中的数字不是员工ID：3月5日、3/5、12号、9点、8:30、7天、3个人
+_NOT_ID = re.compile(
+    r"\d{4}[-/年]\d{1,2}[-/月]\d{1,2}[日号]?|\d{1,2}[/月]\d{1,2}[日号]?|\d{1,2}:\d{2}|\d{1,2}：\d{2}"
+    r"|\d+(?:[年月日号点时天个名人次周]|分钟|小时|星期)"
+)
+
+
+def parse_date_range(text, today):
+    """解析问题中的日期表达，返回 (开始日期, 结束日期, 描述)；没有日期表达时返回None"""
+    match = _FULL_DATE.search(text)
+    if match:
+        day = datetime.date(*(int(v) for v in match.groups()))
+        return day, day, day.isoformat()
+    match = _MONTH_DAY.search(text) or _SLASH_DATE.search(text)
+    if match:
+        day = datetime.date(today.year, int(match.group(1)), int(match.group(2)))
+        return day, day, day.isoformat()
+
+    match = _RECENT_DAYS.search(text)
+    if match and int(match.group(1)) > 0:
+        days = int(match.group(1))
+        return today - datetime.timedelta(days=days - 1), today, f"最近{days}天"
+
+    if "前天" in text:
+        day = today - datetime.timedelta(days=2)
+        return day, day, "前天"
+    if "昨天" in text or "昨日" in text:
+        day = today - datetime.timedelta(days=1)
+        return day, day, "昨天"
+    if "今天" in text or "今日" in text:
+        return today, today, "今天"
+
+    monday = today - datetime.timedelta(days=today.weekday())
+    if "上周" in text or "上星期" in text or "上个星期" in text:
+        return monday - datetime.timedelta(days=7), monday - datetime.timedelta(days=1), "上周"
+    if "本周" in text or "这周" in text or "这个星期" in text or "本星期" in text:
+        return monday, today, "本周"
+
+    first_of_month = today.replace(day=1)
+    if "上个月" in text or "上月" in text:
+        last_month_end = first_of_month - datetime.timedelta(days=1)
+        return last_month_end.replace(day=1), last_month_end, "上个月"
+    if "本月" in text or "这个月" in text:
+        return first_of_month, today, "本月"
+    return None
+
+
+def find_employees(text, employee_names):
+    """
+    问题中提到的员工（按姓名或员工ID），返回 [(员工ID, 姓名), ...]
+    较长的姓名优先匹配，"张三丰"不会同时匹配到"张三"；
+    日期、时间和数量中的数字（"3月5日"、"9点"、"7天"）不当作员工ID
+    """
+    found = []
+    remaining = text
+    for emp_id, name in sorted(employee_names.items(), key=lambda item: -len(item[1])):
+        if name and name in remaining:
+            found.append((emp_id, name))
+            remaining = remaining.replace(name, " ")
+    numbers = set()
+    for match in _MARKED_ID.finditer(remaining):
+        numbers.add(match.group(1) or match.group(2))
+    remaining = _NOT_ID.sub(" ", _MARKED_ID.sub(" ", remaining))
+    numbers.update(re.findall(r"\d+", remaining))
+    for emp_id, name in sorted(employee_names.items()):
+        if emp_id in numbers and (emp_id, name) not in found:
+            found.append((emp_id, name))
+    return found
+
+
+def _contains_any(text, keywords):
+    return any(keyword in text for keyword in keywords)
+
+
+def _day_label(day, label):
+    if label == day.isoformat():
+        return f"{label}（星期{WEEKDAYS[day.weekday()]}）"
+    return f"{label}（{day.isoformat()}，星期{WEEKDAYS[day.weekday()]}）"
+
+
+class LocalQueryEngine:
+    """本地问答引擎，查询考勤存储的汇总表"""
+
+    def __init__(self, store, employee_names):
+        """employee_names为 {员工ID: 姓名}，直接引用，员工变动后无需重建"""
+        self.store = store
+        self.employee_names = employee_names
+
+    def match_employee(self, text):
+        """问题中只提到一名员工时返回 (员工ID, 姓名)，否则返回None"""
+        found = find_employees(text, self.employee_names)
+        return found[0] if len(found) == 1 else None
+
+    def answer(self, query, today=None):
+        """能识别的问题返回回答文本，否则返回None"""
+        text = re.sub(r"\s+", "", query)
+        if not text or _contains_any(text, OPEN_ENDED_KEYWORDS):
+            return None
+
+        today = today or datetime.date.today()
+        try:
+            date_range = parse_date_range(text, today)
+        except ValueError:
+            return None  # 无效日期（如2月30日）
+        employee = self.match_employee(text)
+
+        if employee is not None:
+            if _contains_any(text, RECORD_KEYWORDS):
+                start, end, label = date_range or (today - datetime.timedelta(days=today.weekday()), today, "本周")
+                return self.employee_records(employee, start, end, label)
+            return None
+
+        start, end, label = date_range or (today, today, "今天")
+        single_day = start == end
+        if single_day and _contains_any(text, ABSENT_KEYWORDS):
+            return self.absent(start, label)
+        if single_day and _contains_any(text, EARLIEST_KEYWORDS):
+            return self.arrival_order(start, label, latest=False)
+        if single_day and _contains_any(text, LATEST_KEYWORDS):
+            return self.arrival_order(start, label, latest=True)
+        if _contains_any(text, HEADCOUNT_KEYWORDS):
+            return self.headcount(start, end, label)
+        return None
+
+    def headcount(self, start, end, label):
+        """出勤人数"""
+        headcount = self.store.daily_headcount(start.isoformat(), end.isoformat())
+        if start == end:
+            title = _day_label(start, label)
+            if headcount.empty:
+                return f"{title}还没有人打卡。"
+            row = headcount.iloc[0]
+            total = len(self.employee_names)
+            suffix = f"，共 {total} 名员工" if total else ""
+            return f"{title}出勤 {int(row['出勤人数'])} 人（打卡 {int(row['打卡次数'])} 次）{suffix}。"
+
+        title = f"{label}（{start.isoformat()} 至 {end.isoformat()}）"
+        if headcount.empty:
+            return f"{title}没有考勤记录。"
+        people = self.store.daily_summary(start.isoformat(), end.isoformat())["员工ID"].nunique()
+        lines = [f"{title}共有 {people} 人出勤，每日出勤人数："]
+        for _, row in headcount.iterrows():
+            day = datetime.date.fromisoformat(row["日期"])
+            lines.append(f"  {row['日期']}（星期{WEEKDAYS[day.weekday()]}）：{int(row['出勤人数'])} 人")
+        return "\n".join(lines)
+
+    def absent(self, day, label):
+        """未打卡名单"""
+        title = _day_label(day, label)
+        if not self.employee_names:
+            return "暂无员工信息。"
+        daily = self.store.daily_summary(day.isoformat(), day.isoformat())
+        present = set(daily["员工ID"].astype(str))
+        missing = [(emp_id, name) for emp_id, name in sorted(self.employee_names.items()) if emp_id not in present]
+        if not missing:
+            return f"{title}全部 {len(self.employee_names)} 名员工都已打卡。"
+        names = "、".join(f"{name}({emp_id})" for emp_id, name in missing)
+        return f"{title}有 {len(missing)} 人未打卡：{names}"
+
+    def arrival_order(self, day, label, latest=False):
+        """最早/最晚到达（按当天首次打卡时间）"""
+        title = _day_label(day, label)
+        daily = self.store.daily_summary(day.isoformat(), day.isoformat())
+        if daily.empty:
+            return f"{title}还没有人打卡。"
+        daily = daily.sort_values("首次打卡", ascending=not latest, kind="stable").head(3)
+        first = daily.iloc[0]
+        word = "最晚" if latest else "最早"
+        lines = [f"{title}{word}到的是 {first['姓名']}（{first['首次打卡']}）。"]
+        if len(daily) > 1:
+            others = "、".join(f"{row['姓名']}（{row['首次打卡']}）" for _, row in daily.iloc[1:].iterrows())
+            lines.append(f"其次是 {others}。")
+        return "".join(lines)
+
+    def employee_records(self, employee, start, end, label):
+        """某员工在日期范围内的每日打卡"""
+        emp_id, name = employee
+        daily = self.store.daily_summary(start.isoformat(), end.isoformat(), emp_id)
+        if start == end:
+            title = f"{name}{_day_label(start, label)}"
+            if daily.empty:
+                return f"{title}没有打卡记录。"
+            row = daily.iloc[0]
+            return f"{title}首次打卡 {row['首次打卡']}，最后打卡 {row['最后打卡']}，共 {int(row['打卡次数'])} 次。"
+
+        title = f"{name}{label}（{start.isoformat()} 至 {end.isoformat()}）"
+        if daily.empty:
+            return f"{title}没有打卡记录。"
+        lines = [f"{title}出勤 {len(daily)} 天："]
+        for _, row in daily.iterrows():
+            day = datetime.date.fromisoformat(row["日期"])
+            lines.append(f"  {row['日期']}（星期{WEEKDAYS[day.weekday()]}）"
+                         f"  {row['首次打卡']} - {row['最后打卡']}  共 {int(row['打卡次数'])} 次")
+        return "\n".join(lines)
+
+
+def create_query_engine(store, employee_names):
+    """根据config.py创建本地问答引擎，LOCAL_QUERY_ENABLED为False时返回None"""
+    if not get_setting("LOCAL_QUERY_ENABLED", True):
+        return None
+    return LocalQueryEngine(store, employee_names)
+
+
+def self_check():
+    """用内存数据库检查常见问题的回答（python query_engine.py），返回失败的问题数"""
+    from attendance_store import SqliteAttendanceStore, attendance_row
+
+    store = SqliteAttendanceStore(":memory:")
+    names = {"1": "李四", "2": "王五", "3": "张三", "12": "赵六"}
+    store.append([
+        attendance_row("1", "李四", datetime.datetime(2026, 3, 5, 8, 30)),
+        attendance_row("2", "王五", datetime.datetime(2026, 3, 5, 9, 1)),
+        attendance_row("3", "张三", datetime.datetime(2026, 3, 6, 8, 45)),
+    ])
+    engine = LocalQueryEngine(store, names)
+    today = datetime.date(2026, 3, 6)
+
+    # (问题, 回答中应包含的文字；None表示应交给LLM)
+    cases = [
+        # 日期中的数字不是员工ID（张三的ID是3）
+        ("3月5日谁没打卡", "有 2 人未打卡：赵六(12)、张三(3)"),
+        ("3月5日谁来得最早", "最早到的是 李四"),
+        ("3/5谁没打卡", "2026-03-05"),
+        ("2026-03-05有多少人签到", "出勤 2 人"),
+        ("3月5日9点以后谁来得最晚", "最晚到的是 王五"),
+        ("最近7天有多少人打卡", "最近7天（2026-02-28 至 2026-03-06）共有 3 人出勤"),
+        # 姓名和带标记的员工ID
+        ("张三3月6日的打卡记录", "张三2026-03-06"),
+        ("工号3今天的打卡记录", "张三今天"),
+        ("12号员工本月来了几天", "赵六本月"),
+        ("昨天谁没打卡", "张三(3)"),
+        ("为什么3月5日张三没来", None),
+    ]
+    failures = 0
+    try:
+        for query, expected in cases:
+            answer = engine.answer(query, today)
+            ok = answer is None if expected is None else (answer is not None and expected in answer)
+            if not ok:
+                failures += 1
+            print(f"{'✓' if ok else '✗'} {query} -> {answer}")
+    finally:
+        store.close()
+    print(f"共 {len(cases)} 个问题，失败 {failures} 个")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if self_check() else 0)
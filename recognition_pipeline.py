@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+人脸识别处理管线
+把检测、LBPH识别、置信度分级和打卡判定从界面代码中独立出来，
+不依赖Tkinter，可在服务器、批处理和性能分析场景中直接使用
+
+用法:
+    pipeline = RecognitionPipeline(face_recognizer, employee_labels, employee_names)
+    result = pipeline.process(frame)
+    for event in result.events:
+        ...  # 写入考勤
+"""
+
+import datetime
+import json
+import os
+import pickle
+import threading
+import time
+from dataclasses import dataclass, field
+
+import cv2
+
+from app_config import get_setting
+from face_detector import get_face_detector
+from face_tracker import create_face_tracker
+from lbph_matcher import create_matcher
+from motion_gate import create_motion_gate
+
+MODEL_FILE = "face_model.yml"
+LABELS_FILE = "face_labels.pkl"
+EMPLOYEES_FILE = "employees.json"
+
+# 人脸ROI统一尺寸（与训练时一致）
+FACE_SIZE = (200, 200)
+
+# LBPH置信度阈值（值越小越相似）
+CONFIDENCE_HIGH = 50      # 高置信度
+CONFIDENCE_MEDIUM = 65    # 中等置信度
+CONFIDENCE_CHECKIN = 75   # 低于此值才记录考勤
+CONFIDENCE_MATCH = 80     # 低于此值才认为是已知员工
+
+
+def confidence_level(confidence):
+    """根据LBPH距离返回置信度等级（高/中/低）"""
+    if confidence < CONFIDENCE_HIGH:
+        return "高"
+    if confidence < CONFIDENCE_MEDIUM:
+        return "中"
+    return "低"
+
+
+@dataclass
+class FaceDetection:
+    """单个人脸的检测与识别结果"""
+    box: tuple                   # (x, y, w, h)，原始帧坐标
+    label: int = None            # LBPH标签
+    confidence: float = None     # LBPH距离
+    emp_id: str = None           # 识别出的员工ID，未识别为None
+    name: str = None
+    level: str = None            # 置信度等级
+    error: str = None            # 识别出错时的错误信息
+    track_id: int = None         # 人脸轨迹ID（启用跟踪时）
+
+    @property
+    def recognized(self):
+        return self.emp_id is not None
+
+    @property
+    def can_check_in(self):
+        return self.recognized and self.confidence < CONFIDENCE_CHECKIN
+
+
+@dataclass
+class CheckInEvent:
+    """打卡事件（尚未经过冷却期过滤）"""
+    emp_id: str
+    name: str
+    confidence: float
+    timestamp: datetime.datetime
+
+
+@dataclass
+class FrameResult:
+    """单帧处理结果"""
+    frame_index: int
+    detections: list = field(default_factory=list)
+    events: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)  # 各阶段耗时（秒）
+    model_loaded: bool = False
+    detection_skipped: bool = False  # 画面静止，跳过了人脸检测
+
+
+class RecognitionPipeline:
+    """人脸检测 + LBPH识别 + 打卡判定，输入一帧，输出检测结果和打卡事件"""
+
+    def __init__(self, face_recognizer, employee_labels=None, employee_names=None, detector=None,
+                 motion_gate=None, tracker=None, batch_matching=None):
+        self.face_recognizer = face_recognizer
+        # 增量录入更新模型时与识别互斥
+        self.model_lock = threading.Lock()
+        self.employee_labels = employee_labels if employee_labels is not None else {}
+        self.employee_names = employee_names if employee_names is not None else {}
+        # 人脸检测器（检测缩放、检测区域、人脸尺寸范围）
+        self.detector = detector if detector is not None else get_face_detector()
+        # 运动门控（None表示每帧都检测）
+        self.motion_gate = motion_gate
+        # 人脸跟踪器（None表示每帧每张人脸都识别）
+        self.tracker = tracker
+        # 一帧中的所有人脸一次批量匹配（LBPHMatcher），否则逐个调用predict()
+        self.batch_matching = get_setting("BATCH_MATCHING", True) if batch_matching is None else batch_matching
+        self.matcher = None
+
+        self.frame_count = 0
+        self.predict_calls = 0
+        # 各阶段累计耗时，用于性能分析
+        self.stage_totals = {"gray": 0.0, "motion": 0.0, "detect": 0.0, "recognize": 0.0}
+
+    @property
+    def model_loaded(self):
+        return len(self.employee_labels) > 0
+
+    def set_model(self, face_recognizer, employee_labels):
+        """更新识别模型（加载或重新训练后调用）"""
+        self.face_recognizer = face_recognizer
+        self.employee_labels = employee_labels if employee_labels is not None else {}
+        with self.model_lock:
+            self.matcher = None
+        # 旧模型融合出的身份不再可信
+        if self.tracker is not None:
+            self.tracker.reset()
+
+    def detect(self, gray, frame=None):
+        """在灰度图上检测人脸，返回 (x, y, w, h) 列表；frame为对应的BGR图像（DNN检测后端使用）"""
+        return self.detector.detect(gray, frame)
+
+    def predict(self, gray, box):
+        """对人脸区域运行LBPH识别，返回 (标签, 距离)"""
+        return self.predict_batch(gray, [box])[0]
+
+    def _current_matcher(self, log=None):
+        """获取与当前模型一致的批量匹配器（调用方持有model_lock）"""
+        # 增量录入（update）会增加训练样本，样本数变化时追加新样本的直方图
+        if self.matcher is None or len(self.matcher) != len(self.face_recognizer.getLabels()):
+            self.matcher = create_matcher(self.face_recognizer, self.matcher, log=log)
+        return self.matcher
+
+    def prepare_matcher(self, log=None):
+        """
+        提前创建批量匹配器（加载、训练或录入后在后台线程调用），
+        训练样本很多时建立索引需要几秒，避免在视频线程的第一帧才创建
+        """
+        if not self.batch_matching or not self.model_loaded:
+            return
+        with self.model_lock:
+            self._current_matcher(log)
+
+    def predict_batch(self, gray, boxes):
+        """对多个人脸区域运行LBPH识别，返回 [(标签, 距离), ...]"""
+        if not boxes:
+            return []
+        # 调整大小与训练时一致
+        faces = [cv2.resize(gray[y:y+h, x:x+w], FACE_SIZE) for (x, y, w, h) in boxes]
+        self.predict_calls += len(faces)
+        with self.model_lock:
+            if self.batch_matching:
+                return self._current_matcher().predict_batch(faces)
+            return [self.face_recognizer.predict(face) for face in faces]
+
+    def identify(self, detection, label, confidence):
+        """根据识别结果填充员工身份"""
+        detection.label = label
+        detection.confidence = confidence
+        if confidence < CONFIDENCE_MATCH:
+            emp_id = self.employee_labels.get(label)
+            if emp_id:
+                detection.emp_id = emp_id
+                detection.name = self.employee_names.get(emp_id, "未知")
+                detection.level = confidence_level(confidence)
+        return detection
+
+    def recognize(self, box, prediction):
+        """根据识别结果 (标签, 距离) 生成单个人脸的检测结果"""
+        return self.identify(FaceDetection(box=box), *prediction)
+
+    def recognize_tracked(self, box, track, prediction=None):
+        """跟踪中的人脸：本帧有识别结果时加入轨迹，身份取轨迹的融合结果"""
+        detection = FaceDetection(box=box, track_id=track.track_id)
+        if prediction is not None:
+            self.tracker.add_prediction(track, *prediction)
+        if track.confidence is not None:
+            self.identify(detection, track.label, track.confidence)
+        return detection
+
+    def process(self, frame, timestamp=None):
+        """处理一帧BGR图像"""
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        self.frame_count += 1
+        result = FrameResult(frame_index=self.frame_count, model_loaded=self.model_loaded)
+
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        result.timings["gray"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if self.motion_gate is not None and not self.motion_gate.check(gray):
+            result.detection_skipped = True
+        result.timings["motion"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        boxes = [] if result.detection_skipped else self.detect(gray, frame)
+        if self.motion_gate is not None:
+            self.motion_gate.notify_faces(len(boxes))
+        result.timings["detect"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tracks = self.tracker.update(boxes) if self.tracker is not None else [None] * len(boxes)
+
+        # 本帧需要识别的人脸（跟踪中的人脸只在需要复核时识别），一次批量识别
+        pending = []
+        if result.model_loaded:
+            pending = [i for i, track in enumerate(tracks)
+                       if track is None or self.tracker.needs_verification(track)]
+        predictions = {}
+        error = None
+        try:
+            predictions = dict(zip(pending, self.predict_batch(gray, [boxes[i] for i in pending])))
+        except Exception as e:
+            error = str(e)
+
+        for i, (box, track) in enumerate(zip(boxes, tracks)):
+            if not result.model_loaded:
+                detection = FaceDetection(box=box, track_id=track.track_id if track else None)
+            elif error is not None and i in pending:
+                detection = FaceDetection(box=box, track_id=track.track_id if track else None, error=error)
+            elif track is not None:
+                detection = self.recognize_tracked(box, track, predictions.get(i))
+            else:
+                detection = self.recognize(box, predictions[i])
+            result.detections.append(detection)
+
+            if not detection.can_check_in:
+                continue
+            if track is not None:
+                # 每条轨迹在身份确认后只打卡一次
+                if not self.tracker.is_confirmed(track) or detection.emp_id in track.checked_in:
+                    continue
+                track.checked_in.add(detection.emp_id)
+            result.events.append(CheckInEvent(
+                emp_id=detection.emp_id,
+                name=detection.name,
+                confidence=detection.confidence,
+                timestamp=timestamp,
+            ))
+        result.timings["recognize"] = time.perf_counter() - start
+
+        for stage, elapsed in result.timings.items():
+            self.stage_totals[stage] = self.stage_totals.get(stage, 0.0) + elapsed
+        return result
+
+    def reset(self):
+        """清除运动门控和跟踪状态（切换视频或跳转位置后调用）"""
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        if self.tracker is not None:
+            self.tracker.reset()
+
+    def clone(self):
+        """创建共享同一模型、但有独立运动门控和跟踪状态的管线（每路摄像头一个）"""
+        pipeline = RecognitionPipeline(
+            self.face_recognizer, self.employee_labels, self.employee_names, self.detector,
+            motion_gate=create_motion_gate(),
+            tracker=create_face_tracker(CONFIDENCE_MATCH),
+            batch_matching=self.batch_matching,
+        )
+        # 共用模型锁和已读取的训练样本直方图
+        pipeline.model_lock = self.model_lock
+        pipeline.matcher = self.matcher
+        return pipeline
+
+    def stage_stats(self):
+        """返回各阶段平均耗时（毫秒/帧）"""
+        if self.frame_count == 0:
+            return {}
+        return {stage: total * 1000 / self.frame_count for stage, total in self.stage_totals.items()}
+
+
+def load_employee_names(employees_file=EMPLOYEES_FILE):
+    """从employees.json读取 {员工ID: 姓名}"""
+    with open(employees_file, 'r', encoding='utf-8') as f:
+        employees = json.load(f)
+    return {emp["id"]: emp["name"] for emp in employees}
+
+
+def load_pipeline(model_file=MODEL_FILE, labels_file=LABELS_FILE, employees_file=EMPLOYEES_FILE, log=None):
+    """
+    从模型文件和员工文件构建识别管线（无界面场景使用）
+    批量匹配器（及训练样本索引）在这里创建，之后fork出的工作进程通过clone()直接共享，不再各自重建
+    """
+    for path in (model_file, labels_file, employees_file):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"未找到文件: {path}")
+
+    face_recognizer = cv2.face.LBPHFaceRecognizer_create()
+    face_recognizer.read(model_file)
+    with open(labels_file, 'rb') as f:
+        employee_labels = pickle.load(f)
+    pipeline = RecognitionPipeline(face_recognizer, employee_labels, load_employee_names(employees_file),
+                                   motion_gate=create_motion_gate(),
+                                   tracker=create_face_tracker(CONFIDENCE_MATCH))
+    pipeline.prepare_matcher(log=log)
+    return pipeline